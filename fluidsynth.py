@@ -24,12 +24,29 @@
 """
 
 # Standard library modules
+import hashlib
+import itertools
+import logging
+import math
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
 from ctypes import (CDLL, CFUNCTYPE, POINTER, Structure, byref, c_char, c_char_p, c_double,
                     c_float, c_int, c_short, c_size_t, c_uint, c_void_p, create_string_buffer)
 from ctypes.util import find_library
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer
 
 # Third-party modules
-from six import binary_type, iteritems, text_type
+from six import PY2, binary_type, integer_types, iteritems, text_type
+from six.moves import queue
 
 # Constants
 
@@ -57,12 +74,40 @@ FLUID_MIDI_ROUTER_RULE_KEY_PRESSURE = 5      # MIDI key pressure rule
 FLUID_PLAYER_READY = 0  # Player is ready
 FLUID_PLAYER_PLAYING = 1  # Player is currently playing
 FLUID_PLAYER_DONE = 2  # Player is finished playing
+# Interpolation methods
+FLUID_INTERP_NONE = 0  # No interpolation: fastest, but questionable audio quality
+FLUID_INTERP_LINEAR = 1  # Straight-line interpolation: a bit slower, reasonable quality
+FLUID_INTERP_4THORDER = 4  # Fourth-order interpolation: good quality (the default)
+FLUID_INTERP_7THORDER = 7  # Seventh-order interpolation: highest quality
+FLUID_INTERP_DEFAULT = FLUID_INTERP_4THORDER
+FLUID_INTERP_HIGHEST = FLUID_INTERP_7THORDER
 # Driver names
 AUDIO_DRIVER_NAMES = ("alsa, coreaudio, dart, dsound, file, jack, oss, portaudio, pulseaudio, "
                       "sdl2, sndman, waveout").split(", ")
 MIDI_DRIVER_NAMES = "alsa_raw, alsa_seq, coremidi, jack, midishare, oss, winmidi".split(", ")
 AUDIO_FILE_TYPES = ("aiff, au, auto, avr, caf, flac, htk, iff, mat, oga, paf, pvf, raw, sd2, sds, "
                     "sf, voc, w64, wav, xi").split(", ")
+# Settings which affect the rendered audio (used for render cache keys)
+AUDIO_SETTINGS = ("synth.audio-channels, synth.audio-groups, synth.chorus.active, "
+                  "synth.chorus.depth, synth.chorus.level, synth.chorus.nr, synth.chorus.speed, "
+                  "synth.default-soundfont, synth.effects-channels, synth.effects-groups, "
+                  "synth.gain, synth.midi-bank-select, synth.midi-channels, "
+                  "synth.min-note-length, synth.overflow.age, synth.overflow.important, "
+                  "synth.overflow.important-channels, synth.overflow.percussion, "
+                  "synth.overflow.released, synth.overflow.sustained, synth.overflow.volume, "
+                  "synth.polyphony, synth.reverb.active, synth.reverb.damp, synth.reverb.level, "
+                  "synth.reverb.room-size, synth.reverb.width, synth.sample-rate").split(", ")
+# Number of data bytes following each MIDI status byte (-1 for data bytes,
+# None for the variable length system exclusive message)
+MIDI_DATA_BYTES = ([-1] * 0x80 + [2] * 0x40 + [1] * 0x20 + [2] * 0x10 +
+                   [None, 1, 2, 1, 0, 0, 0, 0] + [0] * 8)
+# Standard MIDI file event record (``type`` is the status byte without channel)
+SMF_EVENT_DTYPE = [('tick', '<i8'), ('track', '<u2'), ('type', 'u1'), ('chan', 'u1'),
+                   ('p1', 'u1'), ('p2', 'u1')]
+# Standard MIDI file tempo map record (``tempo`` in microseconds per quarter note)
+SMF_TEMPO_DTYPE = [('tick', '<i8'), ('tempo', '<u4')]
+# Default MIDI tempo (120 BPM)
+SMF_DEFAULT_TEMPO = 500000
 
 # A short circuited or expression to find the FluidSynth library
 # (mostly needed for Windows distributions of libfluidsynth supplied with QSynth)
@@ -231,6 +276,34 @@ fluid_synth_get_cc = cfunc(
     ('chan', c_int, 1),
     ('num', c_int, 1),
     ('pval', POINTER(c_int), 1))
+fluid_synth_get_pitch_bend = cfunc(
+    'fluid_synth_get_pitch_bend',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('chan', c_int, 1),
+    ('ppitch_bend', POINTER(c_int), 1))
+# Variants taking plain addresses as out-parameters, used by Synth.snapshot()
+_fluid_synth_get_cc_addr = cfunc(
+    'fluid_synth_get_cc',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('chan', c_int, 1),
+    ('num', c_int, 1),
+    ('pval', c_void_p, 1))
+_fluid_synth_get_program_addr = cfunc(
+    'fluid_synth_get_program',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('chan', c_int, 1),
+    ('sfont_id', c_void_p, 1),
+    ('bank_num', c_void_p, 1),
+    ('preset_num', c_void_p, 1))
+_fluid_synth_get_pitch_bend_addr = cfunc(
+    'fluid_synth_get_pitch_bend',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('chan', c_int, 1),
+    ('ppitch_bend', c_void_p, 1))
 fluid_synth_program_change = cfunc(
     'fluid_synth_program_change',
     c_int,
@@ -248,6 +321,24 @@ fluid_synth_all_notes_off = cfunc(
     c_int,
     ('synth', c_void_p, 1),
     ('chan', c_int, 1))
+fluid_synth_channel_pressure = cfunc(
+    'fluid_synth_channel_pressure',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('chan', c_int, 1),
+    ('val', c_int, 1))
+
+try:
+    fluid_synth_key_pressure = cfunc(
+        'fluid_synth_key_pressure',
+        c_int,
+        ('synth', c_void_p, 1),
+        ('chan', c_int, 1),
+        ('key', c_int, 1),
+        ('val', c_int, 1))
+except AttributeError:
+    # fluidsynth < 2.0
+    fluid_synth_key_pressure = None
 # Reset functions
 fluid_synth_program_reset = cfunc(
     'fluid_synth_program_reset',
@@ -269,11 +360,57 @@ fluid_synth_write_s16 = cfunc(
     ('rbuf', c_void_p, 1),
     ('roff', c_int, 1),
     ('rincr', c_int, 1))
+fluid_synth_write_float = cfunc(
+    'fluid_synth_write_float',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('len', c_int, 1),
+    ('lbuf', c_void_p, 1),
+    ('loff', c_int, 1),
+    ('lincr', c_int, 1),
+    ('rbuf', c_void_p, 1),
+    ('roff', c_int, 1),
+    ('rincr', c_int, 1))
+fluid_synth_process = cfunc(
+    'fluid_synth_process',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('len', c_int, 1),
+    ('nfx', c_int, 1),
+    ('fx', POINTER(c_void_p), 1),
+    ('nout', c_int, 1),
+    ('out', POINTER(c_void_p), 1))
 fluid_synth_handle_midi_event = cfunc(
     'fluid_synth_handle_midi_event',
     c_int,
     ('data', c_void_p, 1),
     ('event', c_void_p, 1))
+# Performance
+fluid_synth_get_cpu_load = cfunc(
+    'fluid_synth_get_cpu_load',
+    c_double,
+    ('synth', c_void_p, 1))
+fluid_synth_get_active_voice_count = cfunc(
+    'fluid_synth_get_active_voice_count',
+    c_int,
+    ('synth', c_void_p, 1))
+fluid_synth_get_polyphony = cfunc(
+    'fluid_synth_get_polyphony',
+    c_int,
+    ('synth', c_void_p, 1))
+fluid_synth_set_polyphony = cfunc(
+    'fluid_synth_set_polyphony',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('polyphony', c_int, 1))
+
+# Interpolation
+fluid_synth_set_interp_method = cfunc(
+    'fluid_synth_set_interp_method',
+    c_int,
+    ('synth', c_void_p, 1),
+    ('chan', c_int, 1),
+    ('interp_method', c_int, 1))
 
 # Reverb
 fluid_synth_get_reverb_roomsize = cfunc(
@@ -464,6 +601,15 @@ delete_fluid_audio_driver = cfunc(
     'delete_fluid_audio_driver',
     None,
     ('driver', c_void_p, 1))
+# int func(void *data, int len, int nfx, float *fx[], int nout, float *out[])
+fluid_audio_func_t = CFUNCTYPE(c_int, c_void_p, c_int, c_int, POINTER(c_void_p), c_int,
+                               POINTER(c_void_p))
+new_fluid_audio_driver2 = cfunc(
+    'new_fluid_audio_driver2',
+    c_void_p,
+    ('settings', c_void_p, 1),
+    ('func', fluid_audio_func_t, 1),
+    ('data', c_void_p, 1))
 
 # Fluid MIDI driver
 new_fluid_midi_driver = cfunc(
@@ -532,6 +678,51 @@ delete_fluid_midi_router = cfunc(
     c_int,
     ('router', POINTER(fluid_midi_router_t), 1))
 
+# Fluid MIDI events
+new_fluid_midi_event = cfunc(
+    'new_fluid_midi_event',
+    c_void_p)
+delete_fluid_midi_event = cfunc(
+    'delete_fluid_midi_event',
+    None,
+    ('evt', c_void_p, 1))
+fluid_midi_event_set_type = cfunc(
+    'fluid_midi_event_set_type',
+    c_int,
+    ('evt', c_void_p, 1),
+    ('type', c_int, 1))
+fluid_midi_event_set_channel = cfunc(
+    'fluid_midi_event_set_channel',
+    c_int,
+    ('evt', c_void_p, 1),
+    ('chan', c_int, 1))
+fluid_midi_event_set_key = cfunc(
+    'fluid_midi_event_set_key',
+    c_int,
+    ('evt', c_void_p, 1),
+    ('key', c_int, 1))
+fluid_midi_event_set_value = cfunc(
+    'fluid_midi_event_set_value',
+    c_int,
+    ('evt', c_void_p, 1),
+    ('val', c_int, 1))
+fluid_midi_event_set_pitch = cfunc(
+    'fluid_midi_event_set_pitch',
+    c_int,
+    ('evt', c_void_p, 1),
+    ('val', c_int, 1))
+
+try:
+    fluid_midi_event_set_sysex = cfunc(
+        'fluid_midi_event_set_sysex',
+        c_int,
+        ('evt', c_void_p, 1),
+        ('data', c_void_p, 1),
+        ('size', c_int, 1),
+        ('dynamic', c_int, 1))
+except AttributeError:
+    fluid_midi_event_set_sysex = None
+
 # Fluid MIDI router rules
 new_fluid_midi_router_rule = cfunc(
     'new_fluid_midi_router_rule',
@@ -583,6 +774,14 @@ delete_fluid_cmd_handler = cfunc(
         c_void_p,
         ('handler', c_void_p, 1))
 
+# Library version
+try:
+    fluid_version_str = cfunc(
+        'fluid_version_str',
+        c_char_p)
+except AttributeError:
+    fluid_version_str = None
+
 # Preset handling
 try:
     fluid_preset_get_name = cfunc(
@@ -798,6 +997,65 @@ def _e(s, encoding=DEFAULT_ENCODING):
     return s
 
 
+def _buffer_pointer(data):
+    """Return a pointer to the memory of a buffer object, its size and a keep-alive object.
+
+    The pointer can be passed as a ``c_void_p`` argument. No copy of the data
+    is made for ``bytes`` and writable buffers (``bytearray``, writable
+    ``mmap``, NumPy arrays). Read-only buffers are mapped without copying
+    through NumPy, if it is available, and copied otherwise. The keep-alive
+    object must be referenced for as long as the pointer is in use.
+
+    """
+    if isinstance(data, binary_type):
+        return data, len(data), data
+
+    view = memoryview(data)
+
+    if getattr(view, 'c_contiguous', True):
+        nbytes = getattr(view, 'nbytes', len(view) * view.itemsize)
+
+        if not view.readonly:
+            arr = (c_char * nbytes).from_buffer(view)
+            return arr, nbytes, arr
+
+        try:
+            import numpy
+        except ImportError:
+            pass
+        else:
+            arr = numpy.frombuffer(view, dtype=numpy.uint8)
+            return arr.ctypes.data, nbytes, arr
+
+    data = view.tobytes()
+    return data, len(data), data
+
+
+def _cpu_cores(cpu_cores, polyphony=256):
+    """Return a validated ``synth.cpu-cores`` value, choosing one for ``'auto'``.
+
+    In auto mode one core is used per 64 voices of polyphony, up to the
+    number of cores of the host. Fewer voices do not make up for the cost of
+    synchronizing the worker threads.
+
+    """
+    if cpu_cores == 'auto':
+        try:
+            cores = multiprocessing.cpu_count()
+        except NotImplementedError:
+            cores = 1
+
+        return max(1, min(cores, int(polyphony) // 64, 256))
+
+    if isinstance(cpu_cores, bool) or not isinstance(cpu_cores, integer_types):
+        raise TypeError("cpu_cores must be an integer or 'auto'.")
+
+    if not 1 <= cpu_cores <= 256:
+        raise ValueError("cpu_cores must be between 1 and 256.")
+
+    return cpu_cores
+
+
 # Convenience functions
 
 def fluid_synth_write_s16_stereo(synth, nframes):
@@ -816,6 +1074,62 @@ def fluid_synth_write_s16_stereo(synth, nframes):
     return numpy.frombuffer(buf[:], dtype=numpy.int16)
 
 
+def fluid_synth_write_float_stereo(synth, nframes, out=None):
+    """Return generated samples in stereo 32-bit float format.
+
+    :param synth: an instance of class Synth
+    :param nframes: number of sample frames to generate
+    :type nframes: ``int``
+    :param out: optional preallocated C-contiguous array of shape
+        ``(nframes, 2)`` to write the samples to
+    :type out: ``np.array(..., dtype=numpy.float32)``
+    :return: two-dimensional NumPy array of sample frames
+    :rtype: ``np.array(..., dtype=numpy.float32)``
+
+    """
+    import numpy
+    if out is None:
+        out = numpy.empty((nframes, 2), dtype=numpy.float32)
+
+    addr = out.ctypes.data
+    fluid_synth_write_float(synth, nframes, addr, 0, 2, addr, 1, 2)
+    return out
+
+
+def _analyze(analyzers, block):
+    """Update each of the given analyzers with a block of samples."""
+    if analyzers:
+        for analyzer in analyzers:
+            analyzer.update(block)
+
+
+def trailing_silence(data, threshold=1e-4, chunk_size=65536):
+    """Return the number of sample frames in ``data`` up to the end of the audible signal.
+
+    The audio is scanned backwards in chunks, each chunk with a single
+    vectorized comparison, so only the silent end and one chunk are touched.
+
+    :param data: sample frames
+    :type data: NumPy array of shape ``(frames, channels)``
+    :param threshold: absolute sample value below which audio is silent
+    :type threshold: ``float``
+    :rtype: ``int``
+
+    """
+    import numpy
+    end = len(data)
+
+    while end > 0:
+        start = max(0, end - chunk_size)
+        loud = numpy.flatnonzero((numpy.abs(data[start:end]) >= threshold).reshape(end - start, -1)
+                                 .any(axis=1))
+        if len(loud):
+            return start + int(loud[-1]) + 1
+        end = start
+
+    return 0
+
+
 def raw_audio_string(data):
     """Return a string of bytes to send to soundcard.
 
@@ -827,6 +1141,434 @@ def raw_audio_string(data):
     return (data.astype(numpy.int16)).tostring()
 
 
+# Standard MIDI file parsing
+
+SMF = namedtuple('SMF', 'format division events tempo_map')
+RenderStats = namedtuple('RenderStats', 'frames seconds elapsed realtime_factor peak_cpu '
+                         'skipped_frames speedup')
+ChannelState = namedtuple('ChannelState', 'cc program bank sfont pitch_bend')
+
+
+def _smf_header(data):
+    """Return (format, number of tracks, division, offset of first chunk)."""
+    if len(data) < 14:
+        raise ValueError("Not a Standard MIDI File (too short).")
+
+    buf = memoryview(data)
+    try:
+        chunk_id, length, fmt, ntracks, division = struct.unpack_from('>4sIHHH', buf, 0)
+    finally:
+        if not PY2:
+            # An exception traceback must not keep e.g. an mmap exported
+            buf.release()
+
+    if chunk_id != b'MThd' or length < 6:
+        raise ValueError("Not a Standard MIDI File (missing 'MThd' header).")
+
+    if fmt not in (0, 1):
+        raise ValueError("Unsupported Standard MIDI File format %i." % fmt)
+
+    if division & 0x8000:
+        raise ValueError("SMPTE time division is not supported.")
+
+    return fmt, ntracks, division, 8 + length
+
+
+def _parse_smf_track(buf, pos, end, track):
+    """Parse one MTrk chunk body into event and tempo arrays.
+
+    Internal function called by ``iter_smf_tracks()``.
+
+    Handles running status, skips system exclusive and meta events except
+    for tempo changes and stops at the end-of-track meta event.
+
+    """
+    import numpy
+    ticks = []
+    types = []
+    chans = []
+    p1s = []
+    p2s = []
+    tempos = []
+    tick = 0
+    status = 0
+
+    while pos < end:
+        # Delta time (variable length quantity)
+        delta = 0
+        while True:
+            byte = buf[pos]
+            pos += 1
+            delta = (delta << 7) | (byte & 0x7F)
+            if byte < 0x80:
+                break
+
+        tick += delta
+        byte = buf[pos]
+
+        if byte == 0xFF:
+            # Meta event
+            meta_type = buf[pos + 1]
+            pos += 2
+            length = 0
+            while True:
+                byte = buf[pos]
+                pos += 1
+                length = (length << 7) | (byte & 0x7F)
+                if byte < 0x80:
+                    break
+
+            if meta_type == 0x51 and length == 3:
+                tempos.append((tick, (buf[pos] << 16) | (buf[pos + 1] << 8) | buf[pos + 2]))
+            elif meta_type == 0x2F:
+                break
+
+            pos += length
+        elif byte == 0xF0 or byte == 0xF7:
+            # System exclusive event, skipped. Cancels running status.
+            pos += 1
+            length = 0
+            while True:
+                byte = buf[pos]
+                pos += 1
+                length = (length << 7) | (byte & 0x7F)
+                if byte < 0x80:
+                    break
+
+            pos += length
+            status = 0
+        else:
+            if byte & 0x80:
+                status = byte
+                pos += 1
+            elif not status:
+                raise ValueError("Data byte without running status in track %i." % track)
+
+            kind = status & 0xF0
+            ticks.append(tick)
+            types.append(kind)
+            chans.append(status & 0x0F)
+            p1s.append(buf[pos])
+
+            if kind == 0xC0 or kind == 0xD0:
+                p2s.append(0)
+                pos += 1
+            else:
+                p2s.append(buf[pos + 1])
+                pos += 2
+
+    events = numpy.empty(len(ticks), dtype=SMF_EVENT_DTYPE)
+    events['tick'] = ticks
+    events['track'] = track
+    events['type'] = types
+    events['chan'] = chans
+    events['p1'] = p1s
+    events['p2'] = p2s
+    return events, numpy.array(tempos, dtype=SMF_TEMPO_DTYPE)
+
+
+def iter_smf_tracks(data):
+    """Parse a Standard MIDI File track by track.
+
+    Only one track is held in memory as Python objects at a time, so this
+    works well on memory-mapped files.
+
+    :param data: SMF data
+    :type data: ``bytes``, ``bytearray``, ``mmap`` or other buffer object
+    :return: generator yielding ``(track, events, tempos)`` tuples, where
+        ``events`` is a NumPy array of ``SMF_EVENT_DTYPE`` records and
+        ``tempos`` a NumPy array of ``SMF_TEMPO_DTYPE`` records, both with
+        absolute tick times
+
+    """
+    buf = memoryview(data)
+    if PY2:
+        buf = bytearray(buf)
+
+    try:
+        size = len(buf)
+        pos = _smf_header(buf)[3]
+        track = 0
+
+        while pos + 8 <= size:
+            chunk_id, length = struct.unpack_from('>4sI', buf, pos)
+            pos += 8
+            end = min(pos + length, size)
+
+            if chunk_id == b'MTrk':
+                try:
+                    events, tempos = _parse_smf_track(buf, pos, end, track)
+                except IndexError:
+                    raise ValueError("Truncated event in track %i." % track)
+
+                yield track, events, tempos
+                track += 1
+
+            pos = end
+    finally:
+        if not PY2:
+            # Release the buffer export even if a traceback keeps this frame
+            # alive, so that e.g. an mmap of the data can be closed
+            buf.release()
+
+
+def merge_tempo_map(tempos):
+    """Return a normalized tempo map from (possibly unsorted) tempo records.
+
+    The result is sorted by tick, has only the last of several tempo changes
+    at the same tick and always starts at tick 0 (with the default tempo of
+    120 BPM if the first tempo change occurs later).
+
+    """
+    import numpy
+    tempos = numpy.asarray(tempos, dtype=SMF_TEMPO_DTYPE)
+    tempos = tempos[numpy.argsort(tempos['tick'], kind='mergesort')]
+
+    if len(tempos):
+        last = numpy.ones(len(tempos), dtype=bool)
+        last[:-1] = tempos['tick'][1:] != tempos['tick'][:-1]
+        tempos = tempos[last]
+
+    if not len(tempos) or tempos['tick'][0] > 0:
+        start = numpy.array([(0, SMF_DEFAULT_TEMPO)], dtype=SMF_TEMPO_DTYPE)
+        tempos = numpy.concatenate((start, tempos))
+
+    return tempos
+
+
+def parse_smf(data):
+    """Parse a Standard MIDI File (type 0 or 1).
+
+    :param data: SMF data
+    :type data: ``bytes``, ``bytearray``, ``mmap`` or other buffer object
+    :return: ``SMF`` named tuple with the file format, the time division
+        (ticks per quarter note), the channel events of all tracks merged in
+        order of absolute tick time (``SMF_EVENT_DTYPE`` NumPy array) and the
+        tempo map (``SMF_TEMPO_DTYPE`` NumPy array)
+    :rtype: ``SMF``
+
+    """
+    import numpy
+    fmt, ntracks, division = _smf_header(data)[:3]
+    all_events = []
+    all_tempos = []
+
+    for track, events, tempos in iter_smf_tracks(data):
+        all_events.append(events)
+        all_tempos.append(tempos)
+
+    if all_events:
+        events = numpy.concatenate(all_events)
+        # Stable sort keeps track and file order for events at the same tick
+        events = events[numpy.argsort(events['tick'], kind='mergesort')]
+        tempos = numpy.concatenate(all_tempos)
+    else:
+        events = numpy.empty(0, dtype=SMF_EVENT_DTYPE)
+        tempos = numpy.empty(0, dtype=SMF_TEMPO_DTYPE)
+
+    return SMF(fmt, division, events, merge_tempo_map(tempos))
+
+
+def read_smf(filename):
+    """Parse a Standard MIDI File from disk using a read-only memory map.
+
+    :param filename: SMF name / path
+    :type filename: ``str``
+    :rtype: ``SMF``
+
+    See ``parse_smf()``.
+
+    """
+    with open(filename, 'rb') as fp:
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return parse_smf(mm)
+        finally:
+            mm.close()
+
+
+def write_smf(events, division=480, tempo_map=None):
+    """Encode channel events as a type 0 Standard MIDI File in memory.
+
+    Delta times and variable length quantities are computed for all events
+    at once with NumPy, so the cost per event is independent of Python.
+
+    :param events: channel events, e.g. as returned by ``parse_smf()``.
+        Needs at least the ``tick``, ``type``, ``chan``, ``p1`` and ``p2``
+        fields of ``SMF_EVENT_DTYPE``.
+    :type events: NumPy structured array
+    :param division: time division in ticks per quarter note
+    :type division: ``int``
+    :param tempo_map: tempo changes (``SMF_TEMPO_DTYPE`` records). Defaults
+        to a constant tempo of 120 BPM.
+    :type tempo_map: NumPy structured array
+    :return: SMF data, suitable for ``BasePlayer.add_mem()``
+    :rtype: ``bytes``
+
+    """
+    import numpy
+    events = numpy.asarray(events)
+    tempos = merge_tempo_map(tempo_map if tempo_map is not None else [])
+    ev_types = events['type'].astype(numpy.int64)
+
+    if not 0 < division < 0x8000:
+        raise ValueError("Invalid time division %i." % division)
+
+    if numpy.any((ev_types < 0x80) | (ev_types > 0xE0) | (ev_types & 0x0F != 0)):
+        raise ValueError("Invalid channel event type.")
+
+    ntempos = len(tempos)
+    count = ntempos + len(events)
+    ticks = numpy.concatenate((tempos['tick'], events['tick'])).astype(numpy.int64)
+
+    # Fixed-width payload rows: status / meta header plus data bytes
+    payload = numpy.zeros((count, 6), dtype=numpy.uint8)
+    plen = numpy.empty(count, dtype=numpy.int64)
+    tempo = tempos['tempo'].astype(numpy.int64)
+    payload[:ntempos, 0] = 0xFF
+    payload[:ntempos, 1] = 0x51
+    payload[:ntempos, 2] = 3
+    payload[:ntempos, 3] = (tempo >> 16) & 0xFF
+    payload[:ntempos, 4] = (tempo >> 8) & 0xFF
+    payload[:ntempos, 5] = tempo & 0xFF
+    plen[:ntempos] = 6
+    payload[ntempos:, 0] = ev_types | (events['chan'].astype(numpy.int64) & 0x0F)
+    payload[ntempos:, 1] = events['p1'] & 0x7F
+    payload[ntempos:, 2] = events['p2'] & 0x7F
+    plen[ntempos:] = numpy.where((ev_types == 0xC0) | (ev_types == 0xD0), 2, 3)
+
+    # Tempo changes sort before channel events at the same tick
+    order = numpy.argsort(ticks, kind='mergesort')
+    ticks = ticks[order]
+    payload = payload[order]
+    plen = plen[order]
+
+    delta = numpy.diff(ticks, prepend=0) if count else ticks
+    if count and (ticks[0] < 0 or delta.max() > 0x0FFFFFFF):
+        raise ValueError("Event ticks must be non-negative and fit in a MIDI delta time.")
+
+    # Variable length quantities, right-aligned in four columns
+    shifts = numpy.array([21, 14, 7, 0])
+    varlen = ((delta[:, None] >> shifts) & 0x7F).astype(numpy.uint8)
+    varlen[:, :3] |= 0x80
+    nbytes = 1 + (delta >= 1 << 7) + (delta >= 1 << 14) + (delta >= 1 << 21)
+
+    rows = numpy.hstack((varlen, payload))
+    mask = numpy.hstack((numpy.arange(4) >= 4 - nbytes[:, None],
+                         numpy.arange(6) < plen[:, None]))
+    body = rows[mask].tobytes() + b'\x00\xFF\x2F\x00'
+    return (b'MThd' + struct.pack('>IHHH', 6, 0, 1, division) +
+            b'MTrk' + struct.pack('>I', len(body)) + body)
+
+
+class TempoMap(object):
+    """Tempo map of a MIDI file for converting between ticks and seconds.
+
+    Stores the start tick and the cumulative time in microseconds of each
+    tempo segment, so conversions in both directions need only a binary
+    search over the segments.
+
+    """
+
+    def __init__(self, tempos, division, length=0):
+        """Create tempo map.
+
+        :param tempos: tempo changes (``SMF_TEMPO_DTYPE`` records)
+        :type tempos: NumPy structured array
+        :param division: time division in ticks per quarter note
+        :type division: ``int``
+        :param length: length of the file in ticks
+        :type length: ``int``
+
+        """
+        import numpy
+        tempos = merge_tempo_map(tempos)
+        self.division = division
+        self.length = length
+        self.ticks = tempos['tick']
+        self.tempos = tempos['tempo'].astype(numpy.float64)
+        # Time in microseconds at the start of each tempo segment
+        durations = numpy.diff(self.ticks) * self.tempos[:-1] / division
+        self.micros = numpy.concatenate(([0.0], numpy.cumsum(durations)))
+
+    @classmethod
+    def from_smf(cls, data):
+        """Create tempo map from SMF data.
+
+        :param data: SMF data
+        :type data: ``bytes``, ``bytearray``, ``mmap`` or other buffer object
+
+        """
+        division = _smf_header(data)[2]
+        tempos = []
+        length = 0
+
+        for track, events, track_tempos in iter_smf_tracks(data):
+            tempos.extend(track_tempos.tolist())
+            for ticks in (events['tick'], track_tempos['tick']):
+                if len(ticks):
+                    length = max(length, int(ticks.max()))
+
+        return cls(tempos, division, length)
+
+    @classmethod
+    def from_file(cls, filename):
+        """Create tempo map from a Standard MIDI File on disk."""
+        with open(filename, 'rb') as fp:
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return cls.from_smf(mm)
+            finally:
+                mm.close()
+
+    @property
+    def duration(self):
+        """Return length of the file in seconds."""
+        return self.ticks_to_seconds(self.length)
+
+    def ticks_to_seconds(self, ticks):
+        """Convert absolute tick position(s) to seconds.
+
+        :param ticks: position(s) in MIDI ticks
+        :type ticks: ``int`` or array of ``int``
+        :rtype: ``float`` or NumPy array of ``float``
+
+        """
+        import numpy
+        ticks = numpy.asarray(ticks, dtype=numpy.float64)
+        idx = numpy.searchsorted(self.ticks, ticks, side='right') - 1
+        idx = numpy.maximum(idx, 0)
+        micros = self.micros[idx] + (ticks - self.ticks[idx]) * self.tempos[idx] / self.division
+        result = micros / 1e6
+        return float(result) if result.ndim == 0 else result
+
+    def seconds_to_ticks(self, seconds):
+        """Convert time(s) in seconds to absolute tick position(s).
+
+        :param seconds: time(s) in seconds
+        :type seconds: ``float`` or array of ``float``
+        :rtype: ``float`` or NumPy array of ``float``
+
+        """
+        import numpy
+        micros = numpy.asarray(seconds, dtype=numpy.float64) * 1e6
+        idx = numpy.searchsorted(self.micros, micros, side='right') - 1
+        idx = numpy.maximum(idx, 0)
+        ticks = self.ticks[idx] + (micros - self.micros[idx]) * self.division / self.tempos[idx]
+        return float(ticks) if ticks.ndim == 0 else ticks
+
+
+def _parse_time(value):
+    """Convert a time given as seconds or ``'[hh:]mm:ss[.fff]'`` string to seconds."""
+    if isinstance(value, (text_type, binary_type)):
+        seconds = 0.0
+        for part in _d(value).split(':'):
+            seconds = seconds * 60 + float(part)
+        return seconds
+
+    return float(value)
+
+
 # Object-oriented interface, simplifies access to functions
 
 class RouterRule:
@@ -896,16 +1638,78 @@ class BasePlayer(object):
     def add_mem(self, data):
         """Add SMF data to the playlist.
 
+        The data is passed to FluidSynth (which makes its own copy) without an
+        intermediate copy in Python.
+
         :param data: SMF MIDI data
-        :type data: ``bytes`` or ``bytearray``
+        :type data: ``bytes``, ``bytearray``, ``memoryview``, ``mmap`` or
+            another object supporting the buffer protocol, e.g. a NumPy
+            ``uint8`` array
+
+        """
+        ptr, nbytes, keep = _buffer_pointer(data)
+        try:
+            return fluid_player_add_mem(self.player, ptr, nbytes)
+        finally:
+            # Release buffer export, e.g. so that an mmap can be closed
+            del ptr, keep
+
+    def add_many(self, items):
+        """Add several SMF files and / or SMF data buffers to the playlist.
+
+        Text strings and byte strings which do not start with an SMF header
+        are treated as file names and passed to ``add()``, everything else is
+        passed to ``add_mem()``.
+
+        :param items: playlist entries
+        :type items: iterable of ``str`` or buffer objects
+        :return: ``FLUID_OK`` if all entries were added, ``FLUID_FAILED``
+            otherwise
+
+        """
+        result = FLUID_OK
+
+        for item in items:
+            if isinstance(item, text_type) or (isinstance(item, binary_type) and
+                                               not item.startswith(b'MThd')):
+                response = self.add(item)
+            else:
+                response = self.add_mem(item)
+
+            if response != FLUID_OK:
+                result = FLUID_FAILED
+
+        return result
+
+    def add_events(self, events, division=480, tempo_map=None):
+        """Add channel events to the playlist.
+
+        The events are encoded as SMF data in memory with ``write_smf()``
+        and handed to the player with ``add_mem()``.
+
+        :param events: channel events (see ``write_smf()``)
+        :type events: NumPy structured array
+        :param division: time division in ticks per quarter note
+        :type division: ``int``
+        :param tempo_map: tempo changes (``SMF_TEMPO_DTYPE`` records)
+        :type tempo_map: NumPy structured array
 
         """
-        return fluid_player_add_mem(self.player, data, len(data))
+        return self.add_mem(write_smf(events, division, tempo_map))
 
     def play(self):
         """Start playing."""
         return fluid_player_play(self.player)
 
+    def seek(self, ticks):
+        """Seek to given player position.
+
+        :param ticks: position in MIDI ticks
+        :type ticks: ``int``
+
+        """
+        return fluid_player_seek(self.player, ticks)
+
     def join(self):
         """Wait until player is finished playing."""
         return fluid_player_join(self.player)
@@ -1003,33 +1807,198 @@ class Player(BasePlayer):
         'Preset 5': (0.8, 0.0, 0.5, 0.5)
     }
 
-    def play(self, offset=0):
-        """Start playing at given offset.
+    def __init__(self, synth):
+        """Initialize Player instance.
 
-        :param offset: time offset in MIDI ticks
-        :type offset: ``int``
+        :param synth: an instance of class Synth
 
         """
-        if offset != self.current_tick:
-            self.seek(offset)
+        super(Player, self).__init__(synth)
+        # Tempo maps of queued files (or file names, until needed)
+        self.tempo_maps = []
+        # Playlist entry used by tempo_map, position_seconds, duration_seconds
+        # and seek_seconds(). FluidSynth does not report which file is playing,
+        # so set this when playing a playlist with several entries.
+        self.tempo_map_index = 0
+        # Statistics of the last render
+        self.render_stats = None
 
-        return super(Player, self).play()
+    def add(self, filename):
+        """Add Standard MIDI File to the playlist.
 
-    def render(self, filename, filetype=None, quality=0.5, progress_callback=None):
-        """Render MIDI file to audio file.
+        :param filename: SMF name / path
+        :type filename: ``str``
 
-        :param filename: audio output file path and name
-        'type filename: ``str``
-        :param filetype: audio output file type
-        :type filetype: ``str``
-        :param quality: variable bit rate encoding quality when file type is
-            ``flac`` or ``oga``
-        :type quality: ``float`` (0.0 - 1.0)
-        :param progress_callback: Python callable to call after each
-            period-size block of sample frames has been written. Receives the
-            filename, filetype, current total number of sample frames written
-            and the period size as positional arguments in that order.
+        """
+        result = super(Player, self).add(filename)
+        if result == FLUID_OK:
+            # Tempo map is read from the file on first use
+            self.tempo_maps.append(filename)
+        return result
+
+    def add_mem(self, data, tempo_map=False):
+        """Add SMF data to the playlist.
+
+        :param data: SMF data
+        :param tempo_map: whether to extract the tempo map of the data for
+            ``get_tempo_map()`` and the time based methods. This parses the
+            whole data in Python right away, since the buffer is not retained,
+            so it is off by default to keep queuing large corpora cheap.
+        :type tempo_map: ``bool``
+
+        See ``BasePlayer.add_mem()``.
+
+        """
+        result = super(Player, self).add_mem(data)
+        if result == FLUID_OK:
+            if tempo_map:
+                try:
+                    self.tempo_maps.append(TempoMap.from_smf(data))
+                except ValueError:
+                    self.tempo_maps.append(None)
+            else:
+                self.tempo_maps.append(None)
+        return result
+
+    def add_events(self, events, division=480, tempo_map=None):
+        """Add channel events to the playlist.
+
+        See ``BasePlayer.add_events()``.
+
+        """
+        result = BasePlayer.add_mem(self, write_smf(events, division, tempo_map))
+        if result == FLUID_OK:
+            length = int(events['tick'].max()) if len(events) else 0
+            self.tempo_maps.append(
+                TempoMap(tempo_map if tempo_map is not None else [], division, length))
+        return result
+
+    def get_tempo_map(self, index=0):
+        """Return the tempo map of a queued file.
+
+        :param index: position of the file in the playlist
+        :type index: ``int``
+        :rtype: ``TempoMap``
+
+        """
+        tempo_map = self.tempo_maps[index]
+
+        if isinstance(tempo_map, (text_type, binary_type)):
+            try:
+                tempo_map = TempoMap.from_file(_d(tempo_map))
+            except (IOError, ValueError):
+                tempo_map = None
+            self.tempo_maps[index] = tempo_map
+
+        if tempo_map is None:
+            raise ValueError("No tempo map available for playlist entry %i (pass "
+                             "tempo_map=True to add_mem() for SMF data)." % index)
+
+        return tempo_map
+
+    @property
+    def tempo_map(self):
+        """Return the tempo map of playlist entry ``tempo_map_index``.
+
+        This is the first queued file unless ``tempo_map_index`` is changed,
+        so with several files in the playlist it is only correct while the
+        first one plays. Tempo changes made with the ``bpm`` or ``tempo``
+        setters are not reflected in the tempo map.
+
+        :rtype: ``TempoMap``
+
+        """
+        return self.get_tempo_map(self.tempo_map_index)
+
+    @property
+    def position_seconds(self):
+        """Return current player position in seconds, based on ``tempo_map``.
+
+        :rtype: ``float``
+
+        """
+        return self.tempo_map.ticks_to_seconds(self.current_tick)
+
+    @property
+    def duration_seconds(self):
+        """Return duration of playlist entry ``tempo_map_index`` in seconds.
+
+        :rtype: ``float``
+
+        """
+        return self.tempo_map.duration
+
+    def seek_seconds(self, seconds):
+        """Seek to given time position, taking all tempo changes into account.
+
+        The tempo changes are taken from ``tempo_map``.
+
+        :param seconds: position in seconds or as ``'[hh:]mm:ss[.fff]'``
+            string, e.g. ``'02:31'``
+        :type seconds: ``float`` or ``str``
+
+        """
+        ticks = self.tempo_map.seconds_to_ticks(_parse_time(seconds))
+        return self.seek(int(round(ticks)))
+
+    def play(self, offset=0):
+        """Start playing at given offset.
+
+        :param offset: time offset in MIDI ticks
+        :type offset: ``int``
+
+        """
+        if offset != self.current_tick:
+            self.seek(offset)
+
+        return super(Player, self).play()
+
+    def render(self, filename, filetype=None, quality=0.5, progress_callback=None,
+               block_size=None, progress_interval=None, status_interval=1, tail=False,
+               tail_blocks=16, max_tail=10.0):
+        """Render MIDI file to audio file.
+
+        :param filename: audio output file path and name
+        'type filename: ``str``
+        :param filetype: audio output file type
+        :type filetype: ``str``
+        :param quality: variable bit rate encoding quality when file type is
+            ``flac`` or ``oga``
+        :type quality: ``float`` (0.0 - 1.0)
+        :param progress_callback: Python callable to call after each
+            period-size block of sample frames has been written. Receives the
+            filename, filetype, current total number of sample frames written
+            and the period size as positional arguments in that order.
         :type progress_callback: callable with 4 positional args
+        :param block_size: number of sample frames rendered per block. Sets
+            the ``audio.period-size`` setting for the duration of the render.
+            Larger blocks mean fewer calls from Python into FluidSynth.
+        :type block_size: ``int``
+        :param progress_interval: minimum wall clock time in seconds between
+            two calls of ``progress_callback``. By default it is called after
+            every player status check.
+        :type progress_interval: ``float``
+        :param status_interval: number of blocks rendered between two player
+            status checks. Values greater than 1 reduce overhead, but up to
+            ``status_interval - 1`` blocks may be rendered after the end of
+            the MIDI file.
+        :type status_interval: ``int``
+        :param tail: whether to keep rendering after the end of the MIDI file
+            until all voices have finished their release phase, followed by
+            ``tail_blocks`` more blocks for the reverb and chorus tails
+        :type tail: ``bool``
+        :param tail_blocks: number of blocks rendered after the last voice
+            has finished
+        :type tail_blocks: ``int``
+        :param max_tail: maximum length of the tail in seconds
+        :type max_tail: ``float``
+        :return: number of sample frames written
+        :rtype: ``int``
+
+        Statistics about the render are stored as a ``RenderStats`` named
+        tuple in the ``render_stats`` attribute of the player: number of
+        sample frames, length in seconds, wall clock time, realtime factor,
+        peak synth CPU load, skipped frames and speedup from skipping.
 
         Possible choices for ``filetype`` are:
 
@@ -1038,35 +2007,246 @@ class Player(BasePlayer):
 
         See also: http://www.fluidsynth.org/api/fluidsettings.xml#audio.file.type
 
+        The FluidSynth file renderer writes the samples without passing them
+        to Python, so analyzers can not be updated here. Use ``render_to()``
+        with a file sink (e.g. ``WaveFileSink``) and the analyzers instead.
+
         """
+        if status_interval < 1:
+            raise ValueError("Status interval must be at least 1.")
+
         self._set_render_settings(filename, filetype)
+        old_period_size = self.synth.setting('audio.period-size')
+        if block_size is not None:
+            self.synth.setting('audio.period-size', int(block_size))
+
         renderer = new_fluid_file_renderer(self.synth.synth)
         if not renderer:
+            self.synth.setting('audio.period-size', old_period_size)
             raise OSError('Failed to create MIDI file renderer.')
 
         fluid_file_set_encoding_quality(renderer, quality)
         period_size = self.synth.setting('audio.period-size')
+        synth = self.synth.synth
         num_samples = 0  # sample frame counter
+        peak_cpu = 0.0
+        start = next_progress = default_timer()
 
         try:
             while self.status != FLUID_PLAYER_DONE:
-                # Render one block
-                if fluid_file_renderer_process_block(renderer) != FLUID_OK:
-                    raise OSError('MIDI file renderer error.')
+                # Render blocks until next status check
+                for _ in range(status_interval):
+                    if fluid_file_renderer_process_block(renderer) != FLUID_OK:
+                        raise OSError('MIDI file renderer error.')
+
+                num_samples += period_size * status_interval
+                peak_cpu = max(peak_cpu, fluid_synth_get_cpu_load(synth))
 
-                num_samples += period_size
                 if progress_callback:
+                    if progress_interval:
+                        now = default_timer()
+                        if now < next_progress:
+                            continue
+                        next_progress = now + progress_interval
+
                     # For progress reporting
                     progress_callback(filename, filetype, num_samples, period_size)
+
+            if tail:
+                max_frames = num_samples + int(max_tail * self.synth.setting('synth.sample-rate'))
+                quiet = 0
+
+                while quiet < tail_blocks and num_samples < max_frames:
+                    if fluid_file_renderer_process_block(renderer) != FLUID_OK:
+                        raise OSError('MIDI file renderer error.')
+
+                    num_samples += period_size
+                    if quiet or not fluid_synth_get_active_voice_count(synth):
+                        quiet += 1
         finally:
             self.stop()
             self.join()
             self.synth.setting('player.timing-source', 'system')
             self.synth.setting("synth.lock-memory", 1)
+            self.synth.setting('audio.period-size', old_period_size)
             delete_fluid_file_renderer(renderer)
 
+        self.render_stats = self._render_stats(num_samples, default_timer() - start, peak_cpu)
         return num_samples
 
+    def render_to_array(self, block_size=1024, tail=True, tail_blocks=8, max_tail=10.0,
+                        threshold=1e-4, trim=True, analyzers=None):
+        """Render MIDI file to a NumPy array.
+
+        Like ``render()``, but the audio is returned as stereo 32-bit float
+        sample frames instead of being written to a file.
+
+        :param block_size: number of sample frames rendered per block
+        :type block_size: ``int``
+        :param tail: whether to keep rendering after the end of the MIDI file
+            until there are no more active voices and the output has stayed
+            below ``threshold`` for ``tail_blocks`` consecutive blocks
+        :type tail: ``bool``
+        :param tail_blocks: number of consecutive silent blocks ending the tail
+        :type tail_blocks: ``int``
+        :param max_tail: maximum length of the tail in seconds
+        :type max_tail: ``float``
+        :param threshold: absolute sample value below which output is silent
+        :type threshold: ``float``
+        :param trim: whether to remove silence at the end of the audio
+        :type trim: ``bool``
+        :param analyzers: analyzers to update with each rendered block
+        :type analyzers: sequence of ``Analyzer`` instances
+        :return: sample frames
+        :rtype: ``np.array(..., dtype=numpy.float32)`` of shape ``(frames, 2)``
+
+        Statistics about the render are stored in ``render_stats`` (see
+        ``render()``). To analyze audio without keeping all of it in memory,
+        pass the analyzers as sinks to ``render_to()``.
+
+        """
+        import numpy
+        start = default_timer()
+        self._peak_cpu = 0.0
+        blocks = []
+
+        for block in self._render_blocks(block_size, tail, tail_blocks, max_tail, threshold,
+                                         trim):
+            _analyze(analyzers, block)
+            blocks.append(block)
+
+        if blocks:
+            audio = numpy.concatenate(blocks)
+        else:
+            audio = numpy.empty((0, 2), dtype=numpy.float32)
+
+        self.render_stats = self._render_stats(len(audio), default_timer() - start,
+                                               self._peak_cpu)
+        return audio
+
+    def render_to(self, sinks, block_size=1024, tail=True, tail_blocks=8, max_tail=10.0,
+                  threshold=1e-4, trim=True, threaded=True, queue_size=16):
+        """Render MIDI file once and send the audio to several sinks.
+
+        Every rendered block is passed to all sinks, so e.g. a WAV file, a
+        FLAC file and a raw PCM stream can be written in a single pass. With
+        ``threaded`` each sink consumes blocks in its own worker thread from
+        a bounded queue, so encoding and I/O overlap with synthesis.
+
+        :param sinks: audio sinks (``Sink`` or ``Analyzer`` instances)
+        :type sinks: sequence
+        :param threaded: whether to wrap sinks in ``ThreadedSink``
+        :type threaded: ``bool``
+        :param queue_size: maximum number of blocks queued per threaded sink
+        :type queue_size: ``int``
+        :return: number of sample frames rendered
+        :rtype: ``int``
+
+        See ``render_to_array()`` for the other parameters. All sinks are
+        closed when rendering is finished. Statistics about the render are
+        stored in ``render_stats``.
+
+        """
+        if threaded:
+            sinks = [sink if isinstance(sink, ThreadedSink) else ThreadedSink(sink, queue_size)
+                     for sink in sinks]
+
+        start = default_timer()
+        self._peak_cpu = 0.0
+        frames = 0
+        rendered = False
+
+        try:
+            for block in self._render_blocks(block_size, tail, tail_blocks, max_tail, threshold,
+                                             trim):
+                for sink in sinks:
+                    sink.write(block)
+                frames += len(block)
+            rendered = True
+        finally:
+            # Close every sink, even if closing one of them fails, and raise
+            # the first close() error unless rendering failed already
+            error = None
+            for sink in sinks:
+                try:
+                    sink.close()
+                except Exception as e:
+                    if error is None:
+                        error = e
+
+            if error is not None and rendered:
+                raise error
+
+        self.render_stats = self._render_stats(frames, default_timer() - start, self._peak_cpu)
+        return frames
+
+    def _render_blocks(self, block_size, tail, tail_blocks, max_tail, threshold, trim):
+        """Render MIDI file as a stream of float sample blocks.
+
+        Internal generator used by ``render_to_array()`` and ``render_to()``.
+
+        With ``trim``, silent blocks are held back until audible audio
+        follows, so trailing silence is never emitted. The peak CPU load is
+        stored in ``self._peak_cpu``.
+
+        """
+        import numpy
+        self.synth.setting("player.timing-source", "sample")
+        self.synth.setting("synth.lock-memory", 0)
+        synth = self.synth.synth
+        held = []  # blocks not emitted yet while trimming
+
+        try:
+            for block in self._render_raw_blocks(block_size, tail, tail_blocks, max_tail,
+                                                 threshold):
+                if not trim:
+                    yield block
+                elif (numpy.abs(block) >= threshold).any():
+                    for pending in held:
+                        yield pending
+                    held = [block]
+                else:
+                    held.append(block)
+
+                self._peak_cpu = max(self._peak_cpu, fluid_synth_get_cpu_load(synth))
+        finally:
+            self.stop()
+            self.join()
+            self.synth.setting('player.timing-source', 'system')
+            self.synth.setting("synth.lock-memory", 1)
+
+        # Only the last audible block and the silent blocks after it are left
+        if held and (numpy.abs(held[0]) >= threshold).any():
+            yield held[0][:trailing_silence(held[0], threshold)]
+
+    def _render_raw_blocks(self, block_size, tail, tail_blocks, max_tail, threshold):
+        """Render blocks until the player is done and, optionally, the tail has faded out."""
+        import numpy
+        synth = self.synth.synth
+
+        while self.status != FLUID_PLAYER_DONE:
+            yield fluid_synth_write_float_stereo(synth, block_size)
+
+        if tail:
+            max_blocks = int(max_tail * self.synth.setting('synth.sample-rate') / block_size)
+            quiet = count = 0
+
+            while quiet < tail_blocks and count < max_blocks:
+                block = fluid_synth_write_float_stereo(synth, block_size)
+                count += 1
+
+                if (not fluid_synth_get_active_voice_count(synth) and
+                        not (numpy.abs(block) >= threshold).any()):
+                    quiet += 1
+                else:
+                    quiet = 0
+
+                yield block
+
+    def _render_stats(self, frames, elapsed, peak_cpu):
+        """Return ``RenderStats`` for a finished render."""
+        return self.synth._render_stats(frames, elapsed, peak_cpu)
+
     def _set_render_settings(self, filename, filetype=None):
         """Set audio file and audio file type and non-realtime rendering mode.
 
@@ -1121,7 +2301,7 @@ class Player(BasePlayer):
 class Synth:
     """Represents a FluidSynth synthesizer."""
 
-    def __init__(self, gain=0.2, samplerate=44100.0, channels=256, **kwargs):
+    def __init__(self, gain=0.2, samplerate=44100.0, channels=256, cpu_cores=None, **kwargs):
         """Create new synthesizer object to control sound generation.
 
         Optional keyword arguments:
@@ -1138,6 +2318,11 @@ class Synth:
             internally FluidSynth can use up to 256 channels, which can be
             mapped to different MIDI sources.
         :type channels: ``int``
+        :param cpu_cores: number of CPU cores used for synthesis (1-256), or
+            ``'auto'`` to choose one from the host core count and polyphony.
+            Additional cores only help with many simultaneous voices; keep
+            the default of 1 when running several synths in parallel.
+        :type cpu_cores: ``int`` or ``str``
 
         Additional keyword arguments are interpreted and applied as fluidsynth
         settings, i.e. the argument name is used as the setting name and its
@@ -1157,11 +2342,42 @@ class Synth:
         for opt, val in iteritems(kwargs):
             self.setting(opt, val)
 
+        if cpu_cores is not None:
+            self.setting('synth.cpu-cores',
+                         _cpu_cores(cpu_cores, kwargs.get('synth.polyphony', 256)))
+
         self.synth = new_fluid_synth(self.settings)
         self.audio_driver = None
         self.midi_driver = None
         self.router = None
         self.cmd_handler = None
+        # Audio driver callback set with start(callback=...) and its statistics
+        self.audio_func = None
+        # Thread emulating the file audio driver with a callback
+        self.audio_thread = None
+        self._audio_stop = threading.Event()
+        # Thread reporting the load of a native audio driver to render_observer
+        self.monitor_thread = None
+        self._monitor_stop = threading.Event()
+        self.callback_stats = None
+        self.callback_error = None
+        # Parser and reused event of feed_midi()
+        self.midi_parser = None
+        self.midi_event = None
+        self._midi_route = False
+        # Statistics of the last offline render
+        self.render_stats = None
+        # File names of loaded soundfonts by ID
+        self.soundfonts = {}
+        # Timing of blocks generated with get_samples(), get_samples_float()
+        # and stream(). render_observer is called as (seconds, frames).
+        self.block_count = 0
+        self.block_frames = 0
+        self.block_time = 0.0
+        self.last_block_time = 0.0
+        self.render_observer = None
+        # Interpolation methods set by channel (-1 for all channels)
+        self.interp_methods = {}
 
     def setting(self, opt, val=None):
         """Get/Set an arbitrary synth setting, type-smart."""
@@ -1197,7 +2413,8 @@ class Synth:
         elif isinstance(val, float):
             return fluid_settings_setnum(self.settings, opt, val)
 
-    def start(self, driver=None, device=None, midi_driver=None, cmd_handler=False):
+    def start(self, driver=None, device=None, midi_driver=None, cmd_handler=False,
+              callback=None, observe=False, poll_interval=0.1):
         """Start audio output driver in separate background thread.
 
         Call this function any time after creating the Synth object to start
@@ -1216,6 +2433,29 @@ class Synth:
         :type midi_driver: ``str``
         :param cmd_handler: whether to create a shell command handler
         :type cmd_handler: ``bool`` (default: ``False``)
+        :param callback: Python callable called by the audio driver after
+            synthesis of each period with two lists of ``float32`` NumPy
+            arrays: views of the driver's output buffers and of its effects
+            buffers. The audio can be analyzed or modified in place. The
+            views are reused while the driver passes the same buffers, so
+            normally no arrays are allocated per period. The
+            audio driver is started with the ``audio.driver`` setting if
+            ``driver`` is not given. Timing is recorded in ``callback_stats``
+            and each period is reported to ``render_observer``. The ``file``
+            driver has no callback support in FluidSynth, so it is emulated
+            in a Python thread in this mode (see ``_start_file_driver()``).
+        :type callback: callable
+        :param observe: whether to run the audio driver through a Python
+            callback even if ``callback`` is not given, so that
+            ``render_observer`` gets the exact render time of every period.
+            This adds Python overhead to every period. If the driver has no
+            callback support, the native driver is started instead.
+        :type observe: ``bool``
+        :param poll_interval: with a native audio driver, ``render_observer``
+            (e.g. a ``MetricsSampler`` or ``PolyphonyController``) is called
+            every ``poll_interval`` seconds from a monitoring thread, with the
+            render time estimated from the FluidSynth CPU load
+        :type poll_interval: ``float``
 
         Possible choices for ``driver`` are:
 
@@ -1242,7 +2482,16 @@ class Synth:
             if device is not None:
                 self.setting('audio.%s.device' % driver, device)
 
+        if callback is not None or observe:
+            self.audio_driver = self._new_callback_driver(callback)
+
+            if self.audio_driver is None and self.audio_thread is None:
+                # No callback support, observe the native driver instead
+                self.audio_driver = new_fluid_audio_driver(self.settings, self.synth)
+                self._start_monitor(poll_interval)
+        elif driver is not None:
             self.audio_driver = new_fluid_audio_driver(self.settings, self.synth)
+            self._start_monitor(poll_interval)
 
         if midi_driver is not None:
             if midi_driver not in MIDI_DRIVER_NAMES:
@@ -1262,7 +2511,187 @@ class Synth:
             else:
                 self.cmd_handler = new_fluid_cmd_handler(self.synth, self.router)
 
+    def _new_callback_driver(self, callback):
+        """Create an audio driver synthesizing through a Python callback.
+
+        Internal method called by ``Synth.start()``. Periods taking longer
+        than their duration are counted as ``overruns`` in ``callback_stats``
+        and all periods are reported to ``render_observer``. ``callback`` may
+        be ``None``, then ``None`` is returned if the driver has no callback
+        support.
+        The last exception raised by the callback is kept in
+        ``callback_error``.
+
+        """
+        import numpy
+
+        synth = self.synth
+        samplerate = self.setting('synth.sample-rate')
+        stats = self.callback_stats = {
+            'periods': 0,  # number of callback invocations
+            'frames': 0,  # number of sample frames generated
+            'time': 0.0,  # total time spent in synthesis and callback
+            'callback_time': 0.0,  # total time spent in the Python callback
+            'max_time': 0.0,  # longest period
+            'overruns': 0,  # periods which took longer than realtime
+            'errors': 0,  # exceptions raised by the callback
+        }
+        # Key (length and buffer pointers) and buffer views of the last period.
+        # Drivers normally pass the same buffers, so only one entry is kept.
+        views = [None, None]
+
+        def func(data, length, nfx, fx, nout, out):
+            start = default_timer()
+            result = fluid_synth_process(synth, length, nfx, fx, nout, out)
+            key = (length, nfx, nout, out[0], fx[0] if nfx else None)
+            if views[0] != key:
+                views[0] = key
+                views[1] = (
+                    [numpy.ctypeslib.as_array((c_float * length).from_address(out[i]))
+                     for i in range(nout)],
+                    [numpy.ctypeslib.as_array((c_float * length).from_address(fx[i]))
+                     for i in range(nfx)])
+            buffers = views[1]
+
+            before = default_timer()
+            if callback is not None:
+                try:
+                    callback(*buffers)
+                except Exception as exc:
+                    stats['errors'] += 1
+                    self.callback_error = exc
+            end = default_timer()
+
+            self._observe_block(start, length)
+            elapsed = end - start
+            stats['periods'] += 1
+            stats['frames'] += length
+            stats['time'] += elapsed
+            stats['callback_time'] += end - before
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            if elapsed * samplerate > length:
+                stats['overruns'] += 1
+
+            return result
+
+        # Keep a reference, the driver calls it until it is deleted
+        self.audio_func = fluid_audio_func_t(func)
+        driver = new_fluid_audio_driver2(self.settings, self.audio_func, None)
+
+        if not driver:
+            if self.setting('audio.driver') == 'file':
+                self._start_file_driver()
+                return None
+
+            self.audio_func = None
+            self.callback_stats = None
+
+            if callback is None:
+                return None
+
+            raise RuntimeError("Could not create audio driver '%s' with callback support."
+                               % self.setting('audio.driver'))
+
+        return driver
+
+    def _start_file_driver(self):
+        """Emulate the ``file`` audio driver through ``audio_func`` in a thread.
+
+        Periods of ``audio.period-size`` frames are rendered in real time,
+        with the effects mixed into the output, and written to
+        ``audio.file.name``. The file is written in WAV format if
+        ``audio.file.type`` is ``'wav'`` (or ``'auto'`` and the file name ends
+        with ``.wav``) and as raw samples for ``'raw'``, in the
+        ``audio.file.format`` sample format (``'s16'`` or ``'float'``).
+
+        """
+        import numpy
+
+        def optional(name, default):
+            try:
+                return self.setting(name)
+            except (KeyError, NotImplementedError):
+                return default
+
+        samplerate = self.setting('synth.sample-rate')
+        period = self.setting('audio.period-size')
+        filename = self.setting('audio.file.name')
+        filetype = optional('audio.file.type', 'auto')
+        file_format = optional('audio.file.format', 's16')
+
+        if file_format not in ('s16', 'float'):
+            raise ValueError("Unsupported audio.file.format '%s' with a callback." % file_format)
+        dtype = 'int16' if file_format == 's16' else 'float32'
+
+        if filetype == 'auto':
+            filetype = 'wav' if filename.lower().endswith('.wav') else 'raw'
+
+        if filetype == 'wav':
+            sink = WaveFileSink(filename, int(samplerate), 2, dtype)
+        elif filetype == 'raw':
+            sink = RawFileSink(filename, dtype)
+        else:
+            raise ValueError("Unsupported audio.file.type '%s' with a callback." % filetype)
+
+        out = numpy.zeros((2, period), dtype=numpy.float32)
+        buffers = (c_void_p * 2)(out.ctypes.data, out.ctypes.data + period * 4)
+        stop = self._audio_stop
+        stop.clear()
+
+        def run():
+            due = default_timer()
+            try:
+                while not stop.is_set():
+                    # fluid_synth_process() adds to the buffers, the effects
+                    # go to the output buffers too
+                    out[:] = 0.0
+                    self.audio_func(None, period, 2, buffers, 2, buffers)
+                    sink.write(out.T)
+                    due += period / samplerate
+                    delay = due - default_timer()
+                    if delay > 0:
+                        stop.wait(delay)
+            except Exception as exc:
+                self.callback_error = exc
+            finally:
+                sink.close()
+
+        self.audio_thread = threading.Thread(target=run)
+        self.audio_thread.daemon = True
+        self.audio_thread.start()
+
+    def _start_monitor(self, interval):
+        """Start reporting the load of the native audio driver to ``render_observer``."""
+        if self.monitor_thread is not None:
+            return
+
+        samplerate = self.setting('synth.sample-rate')
+        frames = int(round(interval * samplerate))
+        stop = self._monitor_stop
+        stop.clear()
+
+        def run():
+            while not stop.wait(interval):
+                observer = self.render_observer
+                if observer is not None:
+                    load = fluid_synth_get_cpu_load(self.synth)
+                    observer(load / 100.0 * interval, frames)
+
+        self.monitor_thread = threading.Thread(target=run)
+        self.monitor_thread.daemon = True
+        self.monitor_thread.start()
+
     def delete(self):
+        if self.audio_thread is not None:
+            self._audio_stop.set()
+            self.audio_thread.join()
+            self.audio_thread = None
+
+        if self.monitor_thread is not None:
+            self._monitor_stop.set()
+            self.monitor_thread.join()
+            self.monitor_thread = None
+
         if self.audio_driver is not None:
             delete_fluid_audio_driver(self.audio_driver)
 
@@ -1275,17 +2704,79 @@ class Synth:
         if self.cmd_handler is not None:
             delete_fluid_cmd_handler(self.cmd_handler)
 
+        if self.midi_event is not None:
+            delete_fluid_midi_event(self.midi_event)
+
         delete_fluid_synth(self.synth)
         delete_fluid_settings(self.settings)
+        self.synth = None
+        self.settings = None
 
     def sfload(self, filename, update_midi_preset=0):
         """Load SoundFont and return its ID."""
-        return fluid_synth_sfload(self.synth, _e(filename), update_midi_preset)
+        sfid = fluid_synth_sfload(self.synth, _e(filename), update_midi_preset)
+        if sfid != FLUID_FAILED:
+            self.soundfonts[sfid] = _d(filename)
+        return sfid
 
     def sfunload(self, sfid, update_midi_preset=0):
         """Unload a SoundFont and free memory it used."""
+        self.soundfonts.pop(sfid, None)
         return fluid_synth_sfunload(self.synth, sfid, update_midi_preset)
 
+    def audio_settings(self):
+        """Return all settings and effect parameters which affect the rendered audio.
+
+        :return: mapping of setting name to value for all settings in
+            ``AUDIO_SETTINGS`` supported by the FluidSynth library, plus the
+            current reverb and chorus parameters and interpolation methods
+            set with ``set_interp_method()``
+        :rtype: ``dict``
+
+        """
+        settings = {}
+
+        for name in AUDIO_SETTINGS:
+            try:
+                settings[name] = self.setting(name)
+            except (KeyError, NotImplementedError):
+                pass
+
+        settings['reverb'] = (self.get_reverb_roomsize(), self.get_reverb_damp(),
+                              self.get_reverb_width(), self.get_reverb_level())
+        settings['chorus'] = (self.get_chorus_nr(), self.get_chorus_level(),
+                              self.get_chorus_speed(), self.get_chorus_depth(),
+                              self.get_chorus_type())
+
+        if self.interp_methods:
+            settings['interp_method'] = sorted(self.interp_methods.items())
+
+        return settings
+
+    def set_interp_method(self, method, chan=-1):
+        """Set the interpolation method used for sample playback.
+
+        :param method: one of ``FLUID_INTERP_NONE``, ``FLUID_INTERP_LINEAR``,
+            ``FLUID_INTERP_4THORDER`` (the default) or ``FLUID_INTERP_7THORDER``
+        :type method: ``int``
+        :param chan: MIDI channel, or -1 for all channels
+        :type chan: ``int``
+
+        """
+        if method not in (FLUID_INTERP_NONE, FLUID_INTERP_LINEAR, FLUID_INTERP_4THORDER,
+                          FLUID_INTERP_7THORDER):
+            raise ValueError("Invalid interpolation method %r." % (method,))
+
+        result = fluid_synth_set_interp_method(self.synth, chan, method)
+
+        if result == FLUID_OK:
+            if chan < 0:
+                self.interp_methods = {-1: method}
+            else:
+                self.interp_methods[chan] = method
+
+        return result
+
     def program_select(self, chan, sfid, bank, preset):
         """Select a program"""
         return fluid_synth_program_select(self.synth, chan, sfid, bank, preset)
@@ -1450,7 +2941,7 @@ class Synth:
         return fluid_synth_get_chorus_nr(self.synth)
 
     def get_chorus_level(self):
-        return fluid_synth_get_reverb_level(self.synth)
+        return fluid_synth_get_chorus_level(self.synth)
 
     def get_chorus_type(self):
         return fluid_synth_get_chorus_type(self.synth)
@@ -1516,6 +3007,103 @@ class Synth:
         fluid_synth_get_cc(self.synth, chan, num, byref(i))
         return i.value
 
+    def snapshot(self, out=None):
+        """Return the state of all MIDI channels as NumPy arrays.
+
+        :param out: a previous snapshot of the same synth whose arrays are
+            overwritten instead of allocating new ones
+        :type out: ``ChannelState``
+        :return: ``ChannelState`` namedtuple of ``int32`` arrays: ``cc`` with
+            shape (channels, 128) and ``program``, ``bank``, ``sfont`` and
+            ``pitch_bend`` (raw 14-bit value, 8192 is centered) with shape
+            (channels,)
+
+        FluidSynth has no bulk getter, so this still makes one call per
+        controller, but the values are written straight into the arrays.
+
+        """
+        import numpy
+
+        nchan = self.setting('synth.midi-channels')
+
+        if out is None or out.cc.shape != (nchan, 128):
+            out = ChannelState(numpy.zeros((nchan, 128), dtype=numpy.int32),
+                               *(numpy.zeros(nchan, dtype=numpy.int32) for _ in range(4)))
+
+        synth = self.synth
+        get_cc = _fluid_synth_get_cc_addr
+        cc = out.cc.ctypes.data
+        program, bank, sfont, pitch_bend = (a.ctypes.data for a in out[1:])
+
+        for chan in range(nchan):
+            offset = chan * 4
+            row = cc + chan * 512
+            for num in range(128):
+                get_cc(synth, chan, num, row + num * 4)
+            _fluid_synth_get_program_addr(synth, chan, sfont + offset, bank + offset,
+                                          program + offset)
+            _fluid_synth_get_pitch_bend_addr(synth, chan, pitch_bend + offset)
+
+        return out
+
+    def restore(self, snapshot):
+        """Bring all MIDI channels to a state taken with ``snapshot()``.
+
+        Only values differing from the current state are sent, except for the
+        RPN / NRPN selection (controllers 98-101) and data entry (controllers
+        6 and 38), which are always replayed after the other controllers, so
+        the selected parameter gets the data entry value even if the same
+        values were used for another parameter since. The NRPN selection is
+        sent first unless the RPN selection is null (127, 127), so that the
+        RPN ends up active like after normal use. Channel mode messages
+        (controllers 120-127) are skipped, as setting them would reset
+        controllers or silence the channel rather than restore a value.
+
+        :param snapshot: state to restore
+        :type snapshot: ``ChannelState``
+        :return: number of values applied
+
+        """
+        import numpy
+
+        current = self.snapshot()
+        synth = self.synth
+        nchan = min(len(snapshot.program), len(current.program))
+        diff = snapshot.cc[:nchan, :120] != current.cc[:nchan, :120]
+        applied = 0
+
+        # Parameter number selection and data entry are replayed below
+        order = [num for num in range(120) if num not in (6, 38, 98, 99, 100, 101)]
+
+        for chan, num in zip(*numpy.nonzero(diff[:, order])):
+            num = order[num]
+            fluid_synth_cc(synth, int(chan), num, int(snapshot.cc[chan, num]))
+            applied += 1
+
+        for chan in range(nchan):
+            values = snapshot.cc[chan]
+            if values[101] == 127 and values[100] == 127:
+                replay = (101, 100, 99, 98, 6, 38)
+            else:
+                replay = (99, 98, 101, 100, 6, 38)
+
+            for num in replay:
+                fluid_synth_cc(synth, chan, num, int(values[num]))
+            applied += len(replay)
+
+        for chan in range(nchan):
+            if (snapshot.sfont[chan] != current.sfont[chan] or
+                    snapshot.bank[chan] != current.bank[chan] or
+                    snapshot.program[chan] != current.program[chan]):
+                fluid_synth_program_select(synth, chan, int(snapshot.sfont[chan]),
+                                           int(snapshot.bank[chan]), int(snapshot.program[chan]))
+                applied += 1
+            if snapshot.pitch_bend[chan] != current.pitch_bend[chan]:
+                fluid_synth_pitch_bend(synth, chan, int(snapshot.pitch_bend[chan]))
+                applied += 1
+
+        return applied
+
     def program_change(self, chan, prg):
         """Change the program."""
         return fluid_synth_program_change(self.synth, chan, prg)
@@ -1540,15 +3128,476 @@ class Synth:
         """Turn off all notes on a MIDI channel (put them into release phase)."""
         return fluid_synth_all_notes_off(self.synth, chan)
 
-    def get_samples(self, len=1024):
+    def feed_midi(self, buffer, route=False):
+        """Play a chunk of a raw MIDI byte stream.
+
+        The stream is parsed with a ``MidiParser`` kept between calls, so
+        messages may be split across chunks. Channel messages are sent to
+        the synth directly, or, with ``route``, through the MIDI router
+        created by ``start(midi_driver=...)`` using a reused MIDI event.
+        System exclusive messages and system reset are always sent through
+        the reused MIDI event; other real-time messages are ignored.
+
+        :param buffer: raw MIDI data
+        :type buffer: ``bytes``, ``bytearray`` or other buffer object
+        :param route: whether to send channel messages through the router
+        :type route: ``bool``
+        :return: number of MIDI messages consumed
+
+        """
+        if route and self.router is None:
+            raise ValueError("No MIDI router, start a MIDI driver first.")
+
+        if self.midi_parser is None:
+            self.midi_event = new_fluid_midi_event()
+            self.midi_parser = MidiParser(self._midi_message_handler(), self._send_sysex)
+
+        self._midi_route = route
+        return self.midi_parser.feed(buffer)
+
+    def _midi_message_handler(self):
+        """Return the ``MidiParser`` handler used by ``feed_midi()``."""
+        dispatch = self._event_dispatch()
+        evt = self.midi_event
+
+        def handle(status, p1, p2):
+            if status >= 0xF0:
+                if status == 0xFF:
+                    fluid_midi_event_set_type(evt, status)
+                    self._send_midi_event()
+                return
+
+            kind = status & 0xF0
+
+            if not self._midi_route:
+                handler = dispatch.get(kind)
+                if handler is not None:
+                    handler(status & 0x0F, p1, p2)
+                return
+
+            fluid_midi_event_set_type(evt, kind)
+            fluid_midi_event_set_channel(evt, status & 0x0F)
+
+            if kind == 0xE0:
+                fluid_midi_event_set_pitch(evt, p1 | (p2 << 7))
+            else:
+                # Also the program / pressure parameter of single data byte messages
+                fluid_midi_event_set_key(evt, p1)
+                fluid_midi_event_set_value(evt, p2)
+
+            self._send_midi_event()
+
+        return handle
+
+    def _send_sysex(self, data):
+        """Send a system exclusive message (without 0xF0 / 0xF7) via the reused MIDI event."""
+        if not fluid_midi_event_set_sysex:
+            return
+
+        data = bytes(data)
+        fluid_midi_event_set_type(self.midi_event, 0xF0)
+        fluid_midi_event_set_sysex(self.midi_event, data, len(data), 0)
+        self._send_midi_event()
+
+    def _send_midi_event(self):
+        if self._midi_route:
+            return fluid_midi_router_handle_midi_event(self.router, self.midi_event)
+
+        return fluid_synth_handle_midi_event(self.synth, self.midi_event)
+
+    def get_samples(self, len=1024, automation=None, analyzers=None):
         """Generate audio samples.
 
         The return value will be a NumPy array containing the given
         length of audio samples. If the synth is set to stereo output
         (the default) the array will be size 2 * len.
 
+        :param len: number of sample frames to generate
+        :type len: ``int``
+        :param automation: controller automation to apply while rendering.
+            Its events falling into the rendered block are sent at their
+            exact frame positions and its position is advanced by ``len``.
+        :type automation: ``Automation``
+        :param analyzers: analyzers to update with the generated samples
+        :type analyzers: sequence of ``Analyzer`` instances
+
+        """
+        start = default_timer()
+
+        if automation is None:
+            samples = fluid_synth_write_s16_stereo(self.synth, len)
+        else:
+            samples = self._write_automated(automation, len)
+
+        self._observe_block(start, len)
+        _analyze(analyzers, samples)
+        return samples
+
+    def stream(self, block_size=1024, nframes=None, analyzers=None):
+        """Generate audio as a stream of 32-bit float sample blocks.
+
+        :param block_size: number of sample frames per block
+        :type block_size: ``int``
+        :param nframes: total number of sample frames to generate. The stream
+            is endless if not given.
+        :type nframes: ``int``
+        :param analyzers: analyzers to update with each block
+        :type analyzers: sequence of ``Analyzer`` instances
+        :return: generator yielding ``np.array(..., dtype=numpy.float32)``
+            blocks of shape ``(frames, 2)``
+
+        """
+        remaining = nframes
+
+        while remaining is None or remaining > 0:
+            count = block_size if remaining is None else min(block_size, remaining)
+            start = default_timer()
+            block = fluid_synth_write_float_stereo(self.synth, count)
+            self._observe_block(start, count)
+            _analyze(analyzers, block)
+
+            if remaining is not None:
+                remaining -= count
+
+            yield block
+
+    def get_samples_float(self, len=1024, out=None):
+        """Generate audio samples as 32-bit floats.
+
+        :param len: number of sample frames to generate
+        :type len: ``int``
+        :param out: optional preallocated C-contiguous ``float32`` array of
+            shape ``(len, 2)`` to write the samples to
+        :return: stereo sample frames
+        :rtype: ``np.array(..., dtype=numpy.float32)`` of shape ``(len, 2)``
+
+        """
+        start = default_timer()
+        samples = fluid_synth_write_float_stereo(self.synth, len, out)
+        self._observe_block(start, len)
+        return samples
+
+    def _observe_block(self, start, frames):
+        """Record the render time of a block started at ``start``."""
+        elapsed = default_timer() - start
+        self.block_count += 1
+        self.block_frames += frames
+        self.block_time += elapsed
+        self.last_block_time = elapsed
+
+        if self.render_observer is not None:
+            self.render_observer(elapsed, frames)
+
+    def get_polyphony(self):
+        """Return the maximum number of simultaneous voices."""
+        return fluid_synth_get_polyphony(self.synth)
+
+    def set_polyphony(self, polyphony):
+        """Set the maximum number of simultaneous voices (1-65535)."""
+        return fluid_synth_set_polyphony(self.synth, polyphony)
+
+    def metrics(self):
+        """Return a snapshot of performance metrics.
+
+        :return: ``dict`` with the current ``cpu_load`` (percent),
+            ``active_voices`` and ``polyphony`` limit, and the number of
+            ``blocks`` and ``frames`` generated with ``get_samples()``,
+            ``get_samples_float()`` or ``stream()`` along with their total
+            and last render time in seconds (``block_time``,
+            ``last_block_time``)
+
+        """
+        return {
+            'cpu_load': fluid_synth_get_cpu_load(self.synth),
+            'active_voices': fluid_synth_get_active_voice_count(self.synth),
+            'polyphony': fluid_synth_get_polyphony(self.synth),
+            'blocks': self.block_count,
+            'frames': self.block_frames,
+            'block_time': self.block_time,
+            'last_block_time': self.last_block_time,
+        }
+
+    def render_events(self, events, division=480, tempo_map=None, block_size=1024,
+                      skip_silence=True, threshold=1.5e-5, tail=True, tail_blocks=8,
+                      max_tail=10.0, analyzers=None):
+        """Render channel events offline with sample-accurate timing.
+
+        The events are sent to the synth directly at their exact sample frame
+        positions, without the FluidSynth MIDI player.
+
+        :param events: channel events, e.g. as returned by ``parse_smf()``
+        :type events: NumPy structured array (``SMF_EVENT_DTYPE``)
+        :param division: time division in ticks per quarter note
+        :type division: ``int``
+        :param tempo_map: tempo changes (``SMF_TEMPO_DTYPE`` records) or a
+            ``TempoMap`` instance. Defaults to a constant tempo of 120 BPM.
+        :param block_size: maximum number of sample frames rendered per call
+            into FluidSynth
+        :type block_size: ``int``
+        :param skip_silence: whether to skip synthesis in gaps between events
+            when there are no active voices and the output has been silent
+            for at least ``block_size`` frames, so effect tails are not cut
+            off. The skipped frames are output as zeros. Skipping only
+            happens while reverb and chorus are off (``synth.reverb.active``
+            and ``synth.chorus.active`` settings set to 0, or a level of 0),
+            since their modulation keeps running in silence and the output
+            after a gap would differ from a full render otherwise.
+        :type skip_silence: ``bool``
+        :param threshold: absolute sample value below which output is silent.
+            The default is half the 16-bit quantization step, so skipping is
+            not noticeable in 16-bit output.
+        :type threshold: ``float``
+        :param tail: whether to keep rendering after the last event until
+            there are no more active voices and the output has stayed below
+            ``threshold`` for ``tail_blocks`` consecutive blocks
+        :type tail: ``bool``
+        :param tail_blocks: number of consecutive silent blocks ending the tail
+        :type tail_blocks: ``int``
+        :param max_tail: maximum length of the tail in seconds
+        :type max_tail: ``float``
+        :param analyzers: analyzers to update with the audio while rendering
+        :type analyzers: sequence of ``Analyzer`` instances
+        :return: sample frames
+        :rtype: ``np.array(..., dtype=numpy.float32)`` of shape ``(frames, 2)``
+
+        Statistics about the render, including the number of skipped sample
+        frames and the resulting speedup (output frames per synthesized
+        frame), are stored as a ``RenderStats`` named tuple in the
+        ``render_stats`` attribute.
+
+        """
+        import numpy
+        start = default_timer()
+        samplerate = self.setting('synth.sample-rate')
+
+        if not isinstance(tempo_map, TempoMap):
+            tempo_map = TempoMap(tempo_map if tempo_map is not None else [], division)
+
+        seconds = numpy.atleast_1d(tempo_map.ticks_to_seconds(events['tick']))
+        frames = numpy.rint(seconds * samplerate).astype(numpy.int64)
+        order = numpy.argsort(frames, kind='mergesort')
+        events = events[order]
+        frames = frames[order]
+        skip_silence = skip_silence and not self._effects_running()
+
+        length = int(frames[-1]) if len(frames) else 0
+        audio = numpy.zeros((length, 2), dtype=numpy.float32)
+        dispatch = self._event_dispatch()
+        # quiet: number of silent frames at the end of the rendered output
+        pos = skipped = quiet = 0
+        analyzed = 0  # frames passed to the analyzers
+        peak_cpu = 0.0
+
+        for frame, kind, chan, p1, p2 in zip(frames.tolist(), events['type'].tolist(),
+                                             events['chan'].tolist(), events['p1'].tolist(),
+                                             events['p2'].tolist()):
+            if frame > pos:
+                pos, skip, quiet = self._render_span(audio, pos, frame, block_size,
+                                                     skip_silence, threshold, quiet)
+                skipped += skip
+                peak_cpu = max(peak_cpu, fluid_synth_get_cpu_load(self.synth))
+
+                if analyzers and pos - analyzed >= block_size:
+                    _analyze(analyzers, audio[analyzed:pos])
+                    analyzed = pos
+
+            handler = dispatch.get(kind)
+            if handler is not None:
+                handler(chan, p1, p2)
+
+        _analyze(analyzers, audio[analyzed:])
+        blocks = [audio]
+        if tail:
+            block = numpy.zeros((block_size, 2), dtype=numpy.float32)
+            max_blocks = int(max_tail * samplerate / block_size)
+            quiet_blocks = 0
+
+            while quiet_blocks < tail_blocks and len(blocks) <= max_blocks:
+                if (skip_silence and quiet >= block_size and
+                        not fluid_synth_get_active_voice_count(self.synth)):
+                    # The remaining tail blocks would be silent as well
+                    count = min(tail_blocks - quiet_blocks, max_blocks + 1 - len(blocks))
+                    silence = numpy.zeros((count * block_size, 2), dtype=numpy.float32)
+                    blocks.append(silence)
+                    _analyze(analyzers, silence)
+                    skipped += len(silence)
+                    break
+
+                fluid_synth_write_float_stereo(self.synth, block_size, block)
+                silent = not (numpy.abs(block) >= threshold).any()
+                quiet = quiet + block_size if silent else 0
+                blocks.append(block.copy())
+                _analyze(analyzers, block)
+
+                if silent and not fluid_synth_get_active_voice_count(self.synth):
+                    quiet_blocks += 1
+                else:
+                    quiet_blocks = 0
+
+            audio = numpy.concatenate(blocks)
+
+        self.render_stats = self._render_stats(len(audio), default_timer() - start, peak_cpu,
+                                               skipped)
+        return audio
+
+    def render_note(self, chan, key, vel, duration, block_size=1024, max_release=2.0,
+                    threshold=1.5e-5):
+        """Render a single note offline, including its release phase.
+
+        The note is held for ``duration`` seconds, then released. Rendering
+        continues until no voices are active and the output is silent, for
+        at most ``max_release`` seconds.
+
+        :param chan: MIDI channel
+        :param key: MIDI note number
+        :param vel: note velocity
+        :param duration: time in seconds between note on and note off
+        :type duration: ``float``
+        :param block_size: number of sample frames per block in the release
+        :param max_release: maximum length of the release in seconds
+        :type max_release: ``float``
+        :param threshold: absolute sample value below which output is silent
+        :type threshold: ``float``
+        :return: sample frames
+        :rtype: ``np.array(..., dtype=numpy.float32)`` of shape ``(frames, 2)``
+
+        """
+        import numpy
+        samplerate = self.setting('synth.sample-rate')
+        hold = int(round(duration * samplerate))
+
+        fluid_synth_noteon(self.synth, chan, key, vel)
+        blocks = [fluid_synth_write_float_stereo(self.synth, hold)]
+        fluid_synth_noteoff(self.synth, chan, key)
+
+        for _ in range(int(max_release * samplerate / block_size)):
+            block = fluid_synth_write_float_stereo(self.synth, block_size)
+            blocks.append(block)
+
+            if (not fluid_synth_get_active_voice_count(self.synth) and
+                    not (numpy.abs(block) >= threshold).any()):
+                break
+
+        audio = numpy.concatenate(blocks)
+        return audio[:max(hold, trailing_silence(audio, threshold))]
+
+    def _effects_running(self):
+        """Return whether reverb or chorus are on.
+
+        Their delay line modulation advances even while the output is silent,
+        so synthesis can only be skipped without changing the output while
+        both are off: disabled with the ``synth.reverb.active`` /
+        ``synth.chorus.active`` settings or set to a level of zero.
+
+        """
+        def active(name):
+            try:
+                return bool(self.setting(name))
+            except (KeyError, NotImplementedError):
+                return True
+
+        reverb = active('synth.reverb.active') and self.get_reverb_level() > 0
+        chorus = (active('synth.chorus.active') and self.get_chorus_level() > 0 and
+                  self.get_chorus_nr() > 0)
+        return reverb or chorus
+
+    def _render_span(self, audio, pos, end, block_size, skip_silence, threshold, quiet):
+        """Render sample frames ``pos`` to ``end`` of ``audio`` in blocks.
+
+        Internal method called by ``Synth.render_events()``. The rest of the
+        span is skipped once there are no active voices and the output has
+        been silent for at least ``block_size`` frames (``quiet``), so a
+        single quiet sample in a ringing effect tail does not cut it off.
+
+        :return: tuple of new position, number of skipped frames and number
+            of silent frames at the end of the output
+
+        """
+        import numpy
+        addr = audio.ctypes.data
+        skipped = 0
+
+        while pos < end:
+            if (skip_silence and quiet >= block_size and
+                    not fluid_synth_get_active_voice_count(self.synth)):
+                # Output is zero-initialized, no need to call the synth
+                skipped += end - pos
+                return end, skipped, quiet + end - pos
+
+            count = min(block_size, end - pos)
+            fluid_synth_write_float(self.synth, count, addr, 2 * pos, 2, addr, 2 * pos + 1, 2)
+            loud = numpy.flatnonzero((numpy.abs(audio[pos:pos + count]) >= threshold).any(axis=1))
+            quiet = quiet + count if not len(loud) else count - 1 - int(loud[-1])
+            pos += count
+
+        return pos, skipped, quiet
+
+    def _event_dispatch(self):
+        """Return mapping of channel event type to handler taking (chan, p1, p2)."""
+        synth = self.synth
+        dispatch = {
+            0x80: lambda chan, p1, p2: fluid_synth_noteoff(synth, chan, p1),
+            0x90: lambda chan, p1, p2: fluid_synth_noteon(synth, chan, p1, p2),
+            0xB0: lambda chan, p1, p2: fluid_synth_cc(synth, chan, p1, p2),
+            0xC0: lambda chan, p1, p2: fluid_synth_program_change(synth, chan, p1),
+            0xD0: lambda chan, p1, p2: fluid_synth_channel_pressure(synth, chan, p1),
+            0xE0: lambda chan, p1, p2: fluid_synth_pitch_bend(synth, chan, p1 | (p2 << 7)),
+        }
+
+        if fluid_synth_key_pressure:
+            dispatch[0xA0] = lambda chan, p1, p2: fluid_synth_key_pressure(synth, chan, p1, p2)
+
+        return dispatch
+
+    def _render_stats(self, frames, elapsed, peak_cpu, skipped_frames=0):
+        """Return ``RenderStats`` for a finished render.
+
+        The speedup is the ratio of output frames to synthesized frames,
+        i.e. the gain from skipping silence.
+
+        """
+        seconds = frames / self.setting('synth.sample-rate')
+        synthesized = frames - skipped_frames
+        speedup = frames / float(synthesized) if synthesized > 0 else (
+            float('inf') if frames else 1.0)
+        return RenderStats(frames, seconds, elapsed, seconds / elapsed if elapsed else 0.0,
+                           peak_cpu, skipped_frames, speedup)
+
+    def _write_automated(self, automation, nframes):
+        """Render ``nframes`` frames, applying automation events in between.
+
+        Internal method called by ``Synth.get_samples()``.
+
+        The block is split at the frame positions of the automation events and
+        each segment is written directly into one preallocated buffer.
+
         """
-        return fluid_synth_write_s16_stereo(self.synth, len)
+        import numpy
+        start = automation.position
+        frames, chans, ctrls, values = automation.events(start, start + nframes)
+        buf = numpy.empty(nframes * 2, dtype=numpy.int16)
+        addr = buf.ctypes.data
+        pos = 0
+
+        for frame, chan, ctrl, value in zip(frames.tolist(), chans.tolist(), ctrls.tolist(),
+                                            values.tolist()):
+            offset = frame - start
+            if offset > pos:
+                fluid_synth_write_s16(self.synth, offset - pos, addr, 2 * pos, 2,
+                                      addr, 2 * pos + 1, 2)
+                pos = offset
+
+            if ctrl == Automation.PITCH_BEND:
+                fluid_synth_pitch_bend(self.synth, chan, value + 8192)
+            else:
+                fluid_synth_cc(self.synth, chan, ctrl, value)
+
+        if pos < nframes:
+            fluid_synth_write_s16(self.synth, nframes - pos, addr, 2 * pos, 2,
+                                  addr, 2 * pos + 1, 2)
+
+        automation.position = start + nframes
+        return buf
 
 
 class Sequencer:
@@ -1628,3 +3677,2600 @@ class Sequencer:
 
     def delete(self):
         delete_fluid_sequencer(self.sequencer)
+
+
+class MidiParser(object):
+    """Incremental, table-driven parser for raw MIDI byte streams.
+
+    Handles running status, real-time messages interleaved anywhere (also
+    within other messages) and system exclusive messages. Parser state is
+    kept between calls to ``feed()``, so messages may be split across
+    buffers. System common messages are parsed, but not passed on.
+
+    """
+
+    def __init__(self, handler, sysex_handler=None):
+        """Create a parser.
+
+        :param handler: called for channel and real-time messages with the
+            status byte and two data bytes (0 if not present)
+        :type handler: callable with 3 positional args
+        :param sysex_handler: called for system exclusive messages with their
+            data (without the leading 0xF0 and trailing 0xF7 bytes)
+        :type sysex_handler: callable taking a ``bytearray``
+
+        """
+        self.handler = handler
+        self.sysex_handler = sysex_handler
+        self.reset()
+
+    def reset(self):
+        """Discard any partial message and running status."""
+        self.status = 0  # status of the message being parsed / running status
+        self.needed = -1  # number of data bytes of the current status
+        self.data = []  # data bytes received so far
+        self.sysex = None  # bytearray while receiving a system exclusive message
+
+    def feed(self, buffer):
+        """Parse a chunk of a MIDI byte stream, calling the handlers.
+
+        :param buffer: raw MIDI data
+        :type buffer: ``bytes``, ``bytearray`` or other buffer object
+        :return: number of messages passed on to the handlers
+
+        """
+        handler = self.handler
+        table = MIDI_DATA_BYTES
+        status = self.status
+        needed = self.needed
+        data = self.data
+        sysex = self.sysex
+        count = 0
+
+        for byte in bytearray(buffer):
+            if byte < 0x80:
+                if sysex is not None:
+                    sysex.append(byte)
+                elif needed > 0:
+                    data.append(byte)
+                    if len(data) == needed:
+                        if status < 0xF0:
+                            handler(status, data[0], data[1] if needed == 2 else 0)
+                            count += 1
+                        else:
+                            # System common messages cancel running status
+                            status = 0
+                            needed = -1
+                        data = []
+                continue
+
+            if byte >= 0xF8:
+                handler(byte, 0, 0)
+                count += 1
+                continue
+
+            if sysex is not None:
+                # Any status byte ends a system exclusive message
+                if self.sysex_handler is not None:
+                    self.sysex_handler(sysex)
+                    count += 1
+                sysex = None
+
+            data = []
+            needed = table[byte]
+
+            if needed is None:
+                sysex = bytearray()
+                status = 0
+                needed = -1
+            elif byte >= 0xF0:
+                status = byte if needed else 0
+                needed = needed or -1
+            else:
+                status = byte
+
+        self.status = status
+        self.needed = needed
+        self.data = data
+        self.sysex = sysex
+        return count
+
+
+class Automation(object):
+    """Breakpoint automation lanes for MIDI controllers and pitch bend.
+
+    Each lane is a piecewise linear curve given by breakpoints in seconds.
+    The curves are sampled at ``control_rate`` Hz and quantized to controller
+    values; steps where the value does not change are dropped. The resulting
+    events are applied sample-accurately by ``Synth.get_samples()``.
+
+    """
+
+    # Pseudo controller number for pitch bend lanes
+    PITCH_BEND = -1
+
+    def __init__(self, samplerate=44100.0, control_rate=441.0):
+        """Create new automation object.
+
+        :param samplerate: synth output samplerate in Hz
+        :type samplerate: ``float``
+        :param control_rate: rate in Hz at which the curves are sampled.
+            Higher values give smoother ramps at the cost of more events.
+        :type control_rate: ``float``
+
+        """
+        if control_rate <= 0:
+            raise ValueError("Control rate must be positive.")
+
+        self.samplerate = float(samplerate)
+        self.control_rate = float(control_rate)
+        self.position = 0  # current position in sample frames
+        self.lanes = {}
+        self._schedule = None
+
+    def add_lane(self, chan, ctrl, times, values):
+        """Add or replace the automation curve for a controller.
+
+        :param chan: MIDI channel
+        :type chan: ``int``
+        :param ctrl: controller number (0-127) or ``Automation.PITCH_BEND``
+        :type ctrl: ``int``
+        :param times: breakpoint times in seconds, in ascending order
+        :type times: sequence of ``float``
+        :param values: controller values at the breakpoints. Pitch bend values
+            use the same range as ``Synth.pitch_bend()`` (-8192 to 8191).
+        :type values: sequence of ``float``
+
+        """
+        import numpy
+        times = numpy.asarray(times, dtype=numpy.float64)
+        values = numpy.asarray(values, dtype=numpy.float64)
+
+        if times.ndim != 1 or times.shape != values.shape or not len(times):
+            raise ValueError("Times and values must be non-empty sequences of equal length.")
+
+        if numpy.any(numpy.diff(times) < 0):
+            raise ValueError("Breakpoint times must be in ascending order.")
+
+        self.lanes[(chan, ctrl)] = (times, values)
+        self._schedule = None
+
+    def remove_lane(self, chan, ctrl):
+        """Remove the automation curve for a controller."""
+        del self.lanes[(chan, ctrl)]
+        self._schedule = None
+
+    def reset(self, position=0):
+        """Set the automation position (in sample frames)."""
+        self.position = position
+
+    def events(self, start=0, end=None):
+        """Return the automation events in the frame range ``[start, end)``.
+
+        :return: tuple of NumPy arrays ``(frames, chans, ctrls, values)``
+            sorted by frame position
+
+        """
+        import numpy
+        if self._schedule is None:
+            self._schedule = self._compute()
+
+        frames = self._schedule[0]
+        lo = numpy.searchsorted(frames, start, side='left')
+        hi = len(frames) if end is None else numpy.searchsorted(frames, end, side='left')
+        return tuple(arr[lo:hi] for arr in self._schedule)
+
+    def _compute(self):
+        """Sample, quantize and merge all lanes into one event schedule."""
+        import numpy
+        parts = []
+
+        for (chan, ctrl), (times, values) in sorted(iteritems(self.lanes)):
+            count = int((times[-1] - times[0]) * self.control_rate) + 1
+            t = times[0] + numpy.arange(count) / self.control_rate
+            # Always hit the last breakpoint exactly
+            if t[-1] < times[-1]:
+                t = numpy.append(t, times[-1])
+
+            v = numpy.rint(numpy.interp(t, times, values))
+            if ctrl == self.PITCH_BEND:
+                v = numpy.clip(v, -8192, 8191)
+            else:
+                v = numpy.clip(v, 0, 127)
+
+            v = v.astype(numpy.int32)
+            frames = numpy.rint(t * self.samplerate).astype(numpy.int64)
+            keep = numpy.ones(len(v), dtype=bool)
+            keep[1:] = v[1:] != v[:-1]
+            n = numpy.count_nonzero(keep)
+            parts.append((frames[keep], numpy.full(n, chan, dtype=numpy.int32),
+                          numpy.full(n, ctrl, dtype=numpy.int32), v[keep]))
+
+        if not parts:
+            empty = numpy.empty(0, dtype=numpy.int32)
+            return (numpy.empty(0, dtype=numpy.int64), empty, empty, empty)
+
+        frames, chans, ctrls, values = (numpy.concatenate(arrs) for arrs in zip(*parts))
+        order = numpy.argsort(frames, kind='mergesort')
+        return (frames[order], chans[order], ctrls[order], values[order])
+
+
+class Analyzer(object):
+    """Base class for analyzers updated incrementally with rendered audio blocks.
+
+    Analyzers can be passed to ``Synth.get_samples()``, ``Synth.stream()``,
+    ``Synth.render_events()`` and ``Player.render_to_array()`` to compute
+    statistics while rendering, without a second pass over the audio.
+
+    """
+
+    channels = 2
+
+    def _frames(self, block):
+        """Return block as float sample frames of shape ``(frames, channels)``."""
+        import numpy
+        block = numpy.asarray(block)
+
+        if block.dtype == numpy.int16:
+            block = block / 32768.0
+
+        return block.reshape(-1, self.channels)
+
+    def update(self, block):
+        """Update analysis with a block of samples.
+
+        :param block: ``int16`` or ``float32`` samples, either interleaved
+            (as returned by ``Synth.get_samples()``) or of shape
+            ``(frames, channels)``
+        :type block: NumPy array
+
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """Reset analysis state."""
+        raise NotImplementedError
+
+    def result(self):
+        """Return analysis results as a ``dict``."""
+        raise NotImplementedError
+
+    def write(self, block):
+        """Update analysis with a block of samples (``Sink`` interface)."""
+        self.update(block)
+
+    def close(self):
+        """Finish analysis (``Sink`` interface)."""
+
+
+class LevelAnalyzer(Analyzer):
+    """Computes peak and RMS levels and counts clipped samples per channel.
+
+    The RMS level is the plain root mean square of the samples, not a
+    perceptual loudness measure such as LUFS.
+
+    """
+
+    def __init__(self, channels=2, clip_level=1.0):
+        """Create new level analyzer.
+
+        :param channels: number of interleaved audio channels
+        :type channels: ``int``
+        :param clip_level: absolute sample value (full scale is 1.0) at or
+            above which samples count as clipped. For ``int16`` blocks it is
+            at most 32767 / 32768, so full scale samples count as clipped.
+        :type clip_level: ``float``
+
+        """
+        self.channels = channels
+        self.clip_level = clip_level
+        self.reset()
+
+    def reset(self):
+        import numpy
+        self.frames = 0
+        self.peak = numpy.zeros(self.channels)
+        self.sum_squares = numpy.zeros(self.channels)
+        self.clips = numpy.zeros(self.channels, dtype=numpy.int64)
+
+    def update(self, block):
+        import numpy
+        block = numpy.asarray(block)
+        clip_level = self.clip_level
+
+        if block.dtype == numpy.int16:
+            # Full scale int16 is 32767, which is just below 1.0 after scaling
+            clip_level = min(clip_level, 32767 / 32768.0)
+
+        block = self._frames(block)
+
+        if not len(block):
+            return
+
+        magnitude = numpy.abs(block)
+        numpy.maximum(self.peak, magnitude.max(axis=0), out=self.peak)
+        self.sum_squares += numpy.einsum('ij,ij->j', block, block, dtype=numpy.float64)
+        self.clips += (magnitude >= clip_level).sum(axis=0)
+        self.frames += len(block)
+
+    def result(self):
+        """Return levels.
+
+        :return: ``dict`` with per-channel ``peak``, ``peak_db``, ``rms``,
+            ``rms_db`` and ``clips`` arrays and the total number of
+            ``frames``. Levels in dB are relative to full scale.
+
+        """
+        import numpy
+        rms = numpy.sqrt(self.sum_squares / self.frames) if self.frames else self.sum_squares
+
+        with numpy.errstate(divide='ignore'):
+            return {
+                'frames': self.frames,
+                'peak': self.peak.copy(),
+                'peak_db': 20 * numpy.log10(self.peak),
+                'rms': rms,
+                'rms_db': 20 * numpy.log10(rms),
+                'clips': self.clips.copy(),
+            }
+
+
+class ThumbnailAnalyzer(Analyzer):
+    """Computes a min/max waveform overview with a fixed maximum number of points.
+
+    The overview starts with one sample frame per point. Whenever the number
+    of points exceeds ``width``, neighbouring points are merged pairwise and
+    the number of frames per point doubles, so the length of the audio does
+    not need to be known in advance.
+
+    """
+
+    def __init__(self, width=1024, channels=2):
+        """Create new waveform overview analyzer.
+
+        :param width: maximum number of overview points
+        :type width: ``int``
+        :param channels: number of interleaved audio channels (all channels
+            are combined into one overview)
+        :type channels: ``int``
+
+        """
+        if width < 1:
+            raise ValueError("Width must be at least 1.")
+
+        self.width = width
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        import numpy
+        self.frames = 0
+        self.bucket_size = 1
+        self._mins = numpy.empty(0)
+        self._maxs = numpy.empty(0)
+        # Min, max and frame count of the incomplete last point
+        self._partial = None
+
+    def update(self, block):
+        import numpy
+        block = self._frames(block)
+        count = len(block)
+
+        if not count:
+            return
+
+        lo = block.min(axis=1)
+        hi = block.max(axis=1)
+        size = self.bucket_size
+        pos = 0
+        mins = [self._mins]
+        maxs = [self._maxs]
+
+        if self._partial is not None:
+            pmin, pmax, pcount = self._partial
+            pos = min(size - pcount, count)
+            self._partial = (min(pmin, lo[:pos].min()), max(pmax, hi[:pos].max()), pcount + pos)
+
+            if self._partial[2] == size:
+                mins.append([self._partial[0]])
+                maxs.append([self._partial[1]])
+                self._partial = None
+
+        full = (count - pos) // size
+        if full:
+            end = pos + full * size
+            mins.append(lo[pos:end].reshape(full, size).min(axis=1))
+            maxs.append(hi[pos:end].reshape(full, size).max(axis=1))
+            pos = end
+
+        if pos < count:
+            self._partial = (lo[pos:].min(), hi[pos:].max(), count - pos)
+
+        self._mins = numpy.concatenate(mins)
+        self._maxs = numpy.concatenate(maxs)
+        self.frames += count
+
+        while len(self._mins) + (self._partial is not None) > self.width:
+            self._merge()
+
+    def _merge(self):
+        """Merge neighbouring points pairwise, doubling the frames per point."""
+        import numpy
+        even = len(self._mins) // 2 * 2
+
+        if even < len(self._mins):
+            # Odd point out becomes (part of) the new incomplete point
+            lo, hi, size = self._mins[-1], self._maxs[-1], self.bucket_size
+            if self._partial is not None:
+                lo = min(lo, self._partial[0])
+                hi = max(hi, self._partial[1])
+                size += self._partial[2]
+            self._partial = (lo, hi, size)
+
+        self._mins = numpy.minimum(self._mins[0:even:2], self._mins[1:even:2])
+        self._maxs = numpy.maximum(self._maxs[0:even:2], self._maxs[1:even:2])
+        self.bucket_size *= 2
+
+    def result(self):
+        """Return waveform overview.
+
+        :return: ``dict`` with ``min`` and ``max`` arrays of at most
+            ``width`` points, the number of sample frames per point
+            (``frames_per_point``) and the total number of ``frames``
+
+        """
+        import numpy
+        mins = self._mins
+        maxs = self._maxs
+
+        if self._partial is not None:
+            mins = numpy.append(mins, self._partial[0])
+            maxs = numpy.append(maxs, self._partial[1])
+
+        return {
+            'frames': self.frames,
+            'frames_per_point': self.bucket_size,
+            'min': mins,
+            'max': maxs,
+        }
+
+
+def _to_pcm16(block):
+    """Convert float sample frames to 16-bit signed integer samples."""
+    import numpy
+    block = numpy.asarray(block)
+
+    if block.dtype == numpy.int16:
+        return block
+
+    return (numpy.clip(block, -1.0, 1.0) * 32767.0).astype(numpy.int16)
+
+
+def _as_bytes(array):
+    """Return the samples of a contiguous array as a bytes-like object."""
+    import numpy
+
+    if PY2:
+        # Python 2 mmap slice assignment only takes str
+        return array.tobytes()
+
+    return memoryview(array.reshape(-1).view(numpy.uint8))
+
+
+class Sink(object):
+    """Base class for consumers of rendered audio blocks.
+
+    Sinks receive stereo ``float32`` sample frames of shape ``(frames, 2)``
+    with ``write()``, which must not modify the block, since it is shared
+    with the other sinks. See ``Player.render_to()``.
+
+    """
+
+    def write(self, block):
+        """Consume a block of sample frames."""
+        raise NotImplementedError
+
+    def close(self):
+        """Finish output and release resources."""
+
+
+class StreamSink(Sink):
+    """Writes raw interleaved PCM samples to a file-like object or pipe."""
+
+    def __init__(self, fileobj, dtype='int16', close=False):
+        """Create new raw PCM sink.
+
+        :param fileobj: binary file-like object with a ``write()`` method,
+            e.g. an open file, ``io.BytesIO`` or ``subprocess.Popen.stdin``
+        :param dtype: sample format, ``'int16'`` or ``'float32'``
+        :type dtype: ``str``
+        :param close: whether to close ``fileobj`` when the sink is closed
+        :type close: ``bool``
+
+        """
+        if dtype not in ('int16', 'float32'):
+            raise ValueError("Unsupported sample format '%s'." % dtype)
+
+        self.fileobj = fileobj
+        self.dtype = dtype
+        self._close = close
+
+    def write(self, block):
+        import numpy
+        if self.dtype == 'int16':
+            data = _to_pcm16(block)
+        else:
+            data = numpy.ascontiguousarray(block, dtype=numpy.float32)
+
+        self.fileobj.write(_as_bytes(data))
+
+    def close(self):
+        if self._close:
+            self.fileobj.close()
+        elif hasattr(self.fileobj, 'flush'):
+            self.fileobj.flush()
+
+
+class RawFileSink(StreamSink):
+    """Writes raw interleaved PCM samples to a file."""
+
+    def __init__(self, filename, dtype='int16'):
+        super(RawFileSink, self).__init__(open(filename, 'wb'), dtype, close=True)
+
+
+class WavWriter(object):
+    """Buffered WAV file writer, switching to RF64 for files over 4 GB.
+
+    Small writes are collected in a buffer and written in large chunks,
+    blocks larger than the buffer are written directly from their memory.
+    If the number of sample frames is known in advance, the file can instead
+    be written through a memory map. The header is written with placeholder
+    sizes and a ``JUNK`` chunk reserving room for the RF64 ``ds64`` chunk;
+    it is patched when the file is closed.
+
+    16-bit mono or stereo files use the plain PCM format, float files get an
+    18-byte ``fmt`` chunk and a ``fact`` chunk as required for non-PCM data,
+    and files with more than 2 channels use ``WAVE_FORMAT_EXTENSIBLE``.
+
+    """
+
+    # RIFF chunk sizes are 32-bit
+    MAX_RIFF_SIZE = 0xFFFFFFFF
+    # WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT and WAVE_FORMAT_EXTENSIBLE
+    FORMAT_PCM = 1
+    FORMAT_FLOAT = 3
+    FORMAT_EXTENSIBLE = 0xFFFE
+    # KSDATAFORMAT_SUBTYPE_* GUID without the leading format tag
+    SUBTYPE_GUID = b'\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+
+    def __init__(self, filename, samplerate=44100, channels=2, sample_format='int16',
+                 buffer_size=1 << 20, nframes=None):
+        """Create new WAV file.
+
+        :param filename: output file path and name
+        :type filename: ``str``
+        :param samplerate: sample rate in Hz
+        :type samplerate: ``int``
+        :param channels: number of interleaved channels
+        :type channels: ``int``
+        :param sample_format: ``'int16'`` (16-bit PCM) or ``'float32'``
+            (32-bit IEEE float)
+        :type sample_format: ``str``
+        :param buffer_size: size of the write buffer in bytes
+        :type buffer_size: ``int``
+        :param nframes: number of sample frames to be written. If given, the
+            file is preallocated and written through a memory map. Writing
+            fewer frames truncates the file on ``close()``.
+        :type nframes: ``int``
+
+        """
+        if sample_format not in ('int16', 'float32'):
+            raise ValueError("Unsupported sample format '%s'." % sample_format)
+
+        self.samplerate = int(samplerate)
+        self.channels = channels
+        self.sample_format = sample_format
+        self.frame_size = channels * (2 if sample_format == 'int16' else 4)
+        self.data_size = 0
+        self.header_size = len(self._header())
+        self._mmap = None
+        self._buffer = None
+        self._buffered = 0
+        self.file = open(filename, 'w+b')
+
+        try:
+            self.file.write(self._header())
+
+            if nframes is not None:
+                self.capacity = nframes * self.frame_size
+                self.file.truncate(self.header_size + self.capacity)
+                if self.capacity:
+                    self._mmap = mmap.mmap(self.file.fileno(), 0)
+            elif buffer_size:
+                self._buffer = bytearray(buffer_size)
+        except Exception:
+            self.file.close()
+            raise
+
+    def _header(self):
+        """Return WAV header for the current data size."""
+        riff_size = len(self._format_chunks()) + 48 + self.data_size
+
+        if riff_size > self.MAX_RIFF_SIZE:
+            head = b'RF64' + struct.pack('<I', self.MAX_RIFF_SIZE)
+            ds64 = b'ds64' + struct.pack('<IQQQI', 28, riff_size, self.data_size,
+                                         self.data_size // self.frame_size, 0)
+            data_size = self.MAX_RIFF_SIZE
+        else:
+            head = b'RIFF' + struct.pack('<I', riff_size)
+            ds64 = b'JUNK' + struct.pack('<I', 28) + b'\x00' * 28
+            data_size = self.data_size
+
+        return head + b'WAVE' + ds64 + self._format_chunks() + b'data' + struct.pack('<I',
+                                                                                   data_size)
+
+    def _format_chunks(self):
+        """Return the ``fmt`` chunk and, for float samples, the ``fact`` chunk."""
+        pcm = self.sample_format == 'int16'
+        format_tag = self.FORMAT_PCM if pcm else self.FORMAT_FLOAT
+        bits = 16 if pcm else 32
+        fields = struct.pack('<HIIHH', self.channels, self.samplerate,
+                             self.samplerate * self.frame_size, self.frame_size, bits)
+
+        if self.channels > 2:
+            mask = (1 << self.channels) - 1 if self.channels <= 18 else 0
+            fmt = (struct.pack('<H', self.FORMAT_EXTENSIBLE) + fields +
+                   struct.pack('<HHIH', 22, bits, mask, format_tag) + self.SUBTYPE_GUID)
+        elif pcm:
+            fmt = struct.pack('<H', format_tag) + fields
+        else:
+            fmt = struct.pack('<H', format_tag) + fields + struct.pack('<H', 0)
+
+        chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+        if not pcm:
+            frames = min(self.data_size // self.frame_size, self.MAX_RIFF_SIZE)
+            chunks += b'fact' + struct.pack('<II', 4, frames)
+        return chunks
+
+    def _convert(self, block):
+        """Return block as bytes-like object in the output sample format."""
+        import numpy
+        block = numpy.asarray(block)
+
+        if self.sample_format == 'int16':
+            block = _to_pcm16(block)
+        elif block.dtype == numpy.int16:
+            block = block / numpy.float32(32768.0)
+
+        block = numpy.ascontiguousarray(block, dtype=self.sample_format)
+        return _as_bytes(block)
+
+    def write(self, block):
+        """Write sample frames.
+
+        :param block: ``int16`` or ``float32`` samples, interleaved or of
+            shape ``(frames, channels)``
+        :type block: NumPy array
+
+        """
+        data = self._convert(block)
+        size = len(data)
+
+        if self._mmap is not None:
+            if self.data_size + size > self.capacity:
+                raise ValueError("More sample frames written than announced.")
+
+            offset = self.header_size + self.data_size
+            self._mmap[offset:offset + size] = data
+        elif self._buffer is None:
+            self.file.write(data)
+        elif self._buffered + size <= len(self._buffer):
+            self._buffer[self._buffered:self._buffered + size] = data
+            self._buffered += size
+        else:
+            self._flush_buffer()
+            if size >= len(self._buffer):
+                self.file.write(data)
+            else:
+                self._buffer[:size] = data
+                self._buffered = size
+
+        self.data_size += size
+
+    def _flush_buffer(self):
+        if self._buffered:
+            self.file.write(memoryview(self._buffer)[:self._buffered])
+            self._buffered = 0
+
+    def flush(self):
+        """Write buffered data and update the header."""
+        if self._mmap is not None:
+            self._mmap[:self.header_size] = self._header()
+            self._mmap.flush()
+        else:
+            self._flush_buffer()
+            self.file.seek(0)
+            self.file.write(self._header())
+            self.file.seek(0, 2)
+            self.file.flush()
+
+    def close(self):
+        """Patch the header and close the file."""
+        if self.file.closed:
+            return
+
+        self.flush()
+
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+        # Drop unused preallocated space
+        self.file.truncate(self.header_size + self.data_size)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WaveFileSink(Sink):
+    """Writes WAV (or, for files over 4 GB, RF64) files using ``WavWriter``."""
+
+    def __init__(self, filename, samplerate=44100, channels=2, sample_format='int16',
+                 nframes=None):
+        self.writer = WavWriter(filename, samplerate, channels, sample_format, nframes=nframes)
+
+    def write(self, block):
+        self.writer.write(block)
+
+    def close(self):
+        self.writer.close()
+
+
+class SoundFileSink(Sink):
+    """Writes audio files in any format supported by libsndfile (e.g. FLAC, OGG).
+
+    Requires the ``soundfile`` module.
+
+    """
+
+    def __init__(self, filename, samplerate=44100, channels=2, format=None, subtype=None):
+        import soundfile
+        self.file = soundfile.SoundFile(filename, 'w', int(samplerate), channels,
+                                        subtype=subtype, format=format)
+
+    def write(self, block):
+        self.file.write(block)
+
+    def close(self):
+        self.file.close()
+
+
+class ArraySink(Sink):
+    """Collects all blocks in memory."""
+
+    def __init__(self):
+        self.blocks = []
+
+    def write(self, block):
+        self.blocks.append(block)
+
+    @property
+    def array(self):
+        """Return collected sample frames as one NumPy array."""
+        import numpy
+        if not self.blocks:
+            return numpy.empty((0, 2), dtype=numpy.float32)
+
+        if len(self.blocks) > 1:
+            self.blocks = [numpy.concatenate(self.blocks)]
+
+        return self.blocks[0]
+
+
+class CallbackSink(Sink):
+    """Passes each block to a Python callable."""
+
+    def __init__(self, callback, close_callback=None):
+        self.callback = callback
+        self.close_callback = close_callback
+
+    def write(self, block):
+        self.callback(block)
+
+    def close(self):
+        if self.close_callback:
+            self.close_callback()
+
+
+class ThreadedSink(Sink):
+    """Runs another sink in a worker thread, fed by a bounded queue.
+
+    When the queue is full, ``write()`` blocks until the worker catches up.
+    Errors raised by the wrapped sink are re-raised by ``write()`` or
+    ``close()``.
+
+    """
+
+    _STOP = object()
+
+    def __init__(self, sink, queue_size=16):
+        self.sink = sink
+        self.queue = queue.Queue(queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name='fluidsynth-sink')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            block = self.queue.get()
+
+            if block is self._STOP:
+                break
+
+            if self.error is None:
+                try:
+                    self.sink.write(block)
+                except Exception as exc:
+                    # Keep draining the queue so the producer never blocks
+                    self.error = exc
+
+    def write(self, block):
+        if self.error is not None:
+            raise self.error
+
+        self.queue.put(block)
+
+    def close(self):
+        self.queue.put(self._STOP)
+        self.thread.join()
+        self.sink.close()
+
+        if self.error is not None:
+            raise self.error
+
+
+class RenderCache(object):
+    """Content-addressed on-disk cache of rendered MIDI files.
+
+    Renders are keyed by a hash of the SMF data, the identity of the
+    soundfonts loaded into the synth, all settings and effect parameters
+    affecting the audio (see ``Synth.audio_settings()``), the render
+    parameters and the library versions. Entries are stored in a directory
+    limited to ``max_bytes``; the least recently used entries are evicted
+    first.
+
+    The cache assumes that the MIDI file fully determines the channel
+    programs, i.e. that the synth state before the render does not matter.
+
+    Only files named like cache entries (``<sha256>.npy`` and
+    ``<sha256>.audio``) are listed, evicted or cleared, so other files in
+    ``directory`` are left alone.
+
+    """
+
+    # File names of cache entries
+    ENTRY_NAME = re.compile(r'^[0-9a-f]{64}\.(npy|audio)$')
+
+    def __init__(self, directory, max_bytes=1 << 30, hash_soundfonts=False):
+        """Create new render cache.
+
+        :param directory: cache directory, created if it does not exist
+        :type directory: ``str``
+        :param max_bytes: maximum total size of the cache entries
+        :type max_bytes: ``int``
+        :param hash_soundfonts: whether to identify soundfonts by a hash of
+            their contents instead of their path, size and modification time
+        :type hash_soundfonts: ``bool``
+
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hash_soundfonts = hash_soundfonts
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._soundfont_hashes = {}
+
+    def _soundfont_id(self, filename):
+        stat = os.stat(filename)
+
+        if not self.hash_soundfonts:
+            return (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+
+        ident = (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+        if ident not in self._soundfont_hashes:
+            digest = hashlib.sha256()
+            with open(filename, 'rb') as fp:
+                for chunk in iter(lambda: fp.read(1 << 20), b''):
+                    digest.update(chunk)
+            self._soundfont_hashes[ident] = digest.hexdigest()
+
+        return self._soundfont_hashes[ident]
+
+    def key(self, synth, data, kind, params=None):
+        """Return the cache key for rendering SMF ``data`` with ``synth``.
+
+        :param synth: an instance of class Synth
+        :param data: SMF data
+        :type data: ``bytes`` or other buffer object
+        :param kind: output kind, e.g. ``'array'`` or an audio file type
+        :type kind: ``str``
+        :param params: render parameters
+        :type params: ``dict``
+        :rtype: ``str``
+
+        """
+        digest = hashlib.sha256()
+        digest.update(memoryview(data))
+        meta = (
+            api_version,
+            _d(fluid_version_str()) if fluid_version_str else None,
+            kind,
+            sorted(iteritems(params or {})),
+            sorted((sfid, self._soundfont_id(filename))
+                   for sfid, filename in iteritems(synth.soundfonts)),
+            sorted(iteritems(synth.audio_settings())),
+        )
+        digest.update(_e(repr(meta)))
+        return digest.hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def _hit(self, path):
+        os.utime(path, None)  # Mark as recently used
+        self.hits += 1
+        self.bytes_saved += os.path.getsize(path)
+
+    def _store(self, source, path):
+        """Copy a finished render into the cache and evict old entries."""
+        tmp = path + '.tmp'
+        shutil.copyfile(source, tmp)
+        getattr(os, 'replace', os.rename)(tmp, path)
+        self.evict()
+
+    def render_to_array(self, synth, data, mmap_mode=None, **kwargs):
+        """Render SMF data to a NumPy array, using the cache.
+
+        :param synth: an instance of class Synth
+        :param data: SMF data
+        :type data: ``bytes`` or other buffer object
+        :param mmap_mode: if given, cached arrays are memory-mapped with this
+            mode (see ``numpy.load()``) instead of read into memory
+        :type mmap_mode: ``str``
+
+        Other keyword arguments are passed to ``Player.render_to_array()``.
+
+        """
+        import numpy
+        path = self._path(self.key(synth, data, 'array', kwargs), '.npy')
+
+        if os.path.exists(path):
+            self._hit(path)
+            return numpy.load(path, mmap_mode=mmap_mode)
+
+        self.misses += 1
+        player = Player(synth)
+        try:
+            player.add_mem(data)
+            player.play()
+            audio = player.render_to_array(**kwargs)
+        finally:
+            player.delete()
+
+        tmp = path + '.tmp.npy'
+        numpy.save(tmp, audio)
+        getattr(os, 'replace', os.rename)(tmp, path)
+        self.evict()
+        return audio
+
+    def render(self, synth, data, filename, filetype=None, **kwargs):
+        """Render SMF data to an audio file, using the cache.
+
+        :param synth: an instance of class Synth
+        :param data: SMF data
+        :type data: ``bytes`` or other buffer object
+        :param filename: audio output file path and name
+        :type filename: ``str``
+        :param filetype: audio output file type
+
+        Other keyword arguments are passed to ``Player.render()``.
+        :return: ``True`` if the file was served from the cache
+
+        """
+        kwargs.pop('progress_callback', None)
+        params = dict(kwargs, filetype=filetype, ext=os.path.splitext(filename)[1])
+        path = self._path(self.key(synth, data, 'file', params), '.audio')
+
+        if os.path.exists(path):
+            self._hit(path)
+            shutil.copyfile(path, filename)
+            return True
+
+        self.misses += 1
+        player = Player(synth)
+        try:
+            player.add_mem(data)
+            player.play()
+            player.render(filename, filetype, **kwargs)
+        finally:
+            player.delete()
+
+        self._store(filename, path)
+        return False
+
+    def entries(self):
+        """Return list of ``(last use time, size, path)`` of all cache entries."""
+        entries = []
+
+        for name in os.listdir(self.directory):
+            if not self.ENTRY_NAME.match(name):
+                continue
+
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits into ``max_bytes``."""
+        entries = sorted(self.entries())
+        total = sum(entry[1] for entry in entries)
+
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        """Remove all cache entries."""
+        for mtime, size, path in self.entries():
+            os.remove(path)
+
+    def stats(self):
+        """Return cache metrics.
+
+        :return: ``dict`` with ``hits``, ``misses``, ``hit_rate``,
+            ``bytes_saved`` (size of the renders served from the cache),
+            ``entries`` and ``size`` (total bytes on disk)
+
+        """
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / float(lookups) if lookups else 0.0,
+            'bytes_saved': self.bytes_saved,
+            'entries': len(entries),
+            'size': sum(entry[1] for entry in entries),
+        }
+
+
+class NoteCache(object):
+    """Memory-bounded LRU cache of pre-rendered one-shot notes.
+
+    Each requested (bank, preset, key, velocity, duration) note is rendered
+    once with a private offline ``Synth`` and then served from memory as
+    ``float32`` sample frames, e.g. for mixing into a game audio buffer.
+
+    """
+
+    def __init__(self, soundfont, max_bytes=256 << 20, samplerate=44100.0, max_release=2.0,
+                 **kwargs):
+        """Create new note cache.
+
+        :param soundfont: SoundFont file name / path
+        :type soundfont: ``str``
+        :param max_bytes: maximum total size of the cached samples
+        :type max_bytes: ``int``
+        :param samplerate: sample rate in Hz
+        :type samplerate: ``float``
+        :param max_release: maximum length of a note release in seconds
+        :type max_release: ``float``
+
+        Other keyword arguments are passed to the ``Synth`` constructor.
+
+        """
+        self.synth = Synth(samplerate=samplerate, **kwargs)
+        self.sfid = self.synth.sfload(soundfont)
+
+        if self.sfid == FLUID_FAILED:
+            self.synth.delete()
+            raise OSError("Could not load SoundFont '%s'." % soundfont)
+
+        self.samplerate = float(samplerate)
+        self.max_bytes = max_bytes
+        self.max_release = max_release
+        self.notes = OrderedDict()  # key -> (samples, render time)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.render_seconds = 0.0  # CPU time spent rendering
+        self.saved_seconds = 0.0  # render time avoided by cache hits
+        self._lock = threading.Lock()
+
+    def delete(self):
+        self.clear()
+        self.synth.delete()
+
+    def get(self, bank, preset, key, vel, duration):
+        """Return the samples of a note, rendering it if it is not cached.
+
+        :param bank: soundfont bank number
+        :param preset: soundfont preset number
+        :param key: MIDI note number
+        :param vel: note velocity
+        :param duration: note duration in seconds (rounded to sample frames)
+        :return: sample frames, must not be modified
+        :rtype: ``np.array(..., dtype=numpy.float32)`` of shape ``(frames, 2)``
+
+        """
+        cache_key = (bank, preset, key, vel, int(round(duration * self.samplerate)))
+
+        with self._lock:
+            entry = self.notes.pop(cache_key, None)
+
+            if entry is not None:
+                self.hits += 1
+                self.saved_seconds += entry[1]
+            else:
+                self.misses += 1
+                start = default_timer()
+                self.synth.program_select(0, self.sfid, bank, preset)
+                samples = self.synth.render_note(0, key, vel, duration,
+                                                 max_release=self.max_release)
+                samples.flags.writeable = False
+                entry = (samples, default_timer() - start)
+                self.render_seconds += entry[1]
+                self.bytes += samples.nbytes
+
+            # (Re-)insert as most recently used
+            self.notes[cache_key] = entry
+            self._evict()
+
+        return entry[0]
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self.notes) > 1:
+            samples, cost = self.notes.popitem(last=False)[1]
+            self.bytes -= samples.nbytes
+
+    def prewarm(self, bank, preset, keys, velocities, duration):
+        """Render all combinations of the given keys and velocities into the cache.
+
+        :param keys: MIDI note numbers
+        :type keys: iterable of ``int``
+        :param velocities: note velocities
+        :type velocities: iterable of ``int``
+
+        """
+        velocities = list(velocities)
+        for key in keys:
+            for vel in velocities:
+                self.get(bank, preset, key, vel, duration)
+
+    def mix(self, out, bank, preset, key, vel, duration, offset=0, gain=1.0):
+        """Add a note into an output buffer.
+
+        :param out: output sample frames, modified in place
+        :type out: ``np.array(..., dtype=numpy.float32)`` of shape ``(frames, 2)``
+        :param offset: sample frame position of the note start in ``out``
+        :type offset: ``int``
+        :param gain: linear gain applied to the note
+        :type gain: ``float``
+        :return: number of sample frames of the note that fit into ``out``
+
+        """
+        samples = self.get(bank, preset, key, vel, duration)
+        count = max(0, min(len(samples), len(out) - offset))
+
+        if count:
+            if gain == 1.0:
+                out[offset:offset + count] += samples[:count]
+            else:
+                out[offset:offset + count] += gain * samples[:count]
+
+        return count
+
+    def clear(self):
+        """Remove all notes from the cache."""
+        with self._lock:
+            self.notes.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Return cache metrics.
+
+        :return: ``dict`` with ``hits``, ``misses``, ``hit_rate``, number of
+            cached ``notes``, ``bytes`` used, ``render_seconds`` spent
+            rendering, ``saved_seconds`` of rendering avoided by hits and
+            ``bytes_per_saved_second`` relating memory use to CPU time saved
+
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / float(lookups) if lookups else 0.0,
+            'notes': len(self.notes),
+            'bytes': self.bytes,
+            'render_seconds': self.render_seconds,
+            'saved_seconds': self.saved_seconds,
+            'bytes_per_saved_second': (self.bytes / self.saved_seconds
+                                       if self.saved_seconds else None),
+        }
+
+
+class ParallelRenderer(object):
+    """Renders independent jobs concurrently on a thread pool of synths.
+
+    ctypes releases the GIL while FluidSynth renders audio, so synths
+    running in separate threads of one process render in parallel without
+    the pickling and inter-process communication of a process pool. Each
+    worker thread checks out one of the pooled synths per job.
+
+    Sample data is shared between the synths through the FluidSynth sample
+    cache, which loads the samples of a soundfont file only once per process.
+
+    """
+
+    def __init__(self, soundfonts, threads=None, **kwargs):
+        """Create synths and worker threads.
+
+        :param soundfonts: SoundFont file names / paths to load into each synth
+        :type soundfonts: sequence of ``str``
+        :param threads: number of worker threads and synths, defaults to the
+            number of CPUs
+        :type threads: ``int``
+
+        Other keyword arguments are passed to the ``Synth`` constructor.
+
+        """
+        if threads is None:
+            threads = multiprocessing.cpu_count()
+
+        if isinstance(soundfonts, (text_type, binary_type)):
+            soundfonts = [soundfonts]
+
+        self.threads = threads
+        self.synths = []
+        self._idle = queue.Queue()
+
+        for _ in range(threads):
+            synth = Synth(**kwargs)
+            self.synths.append(synth)
+            for soundfont in soundfonts:
+                if synth.sfload(soundfont) == FLUID_FAILED:
+                    self.delete()
+                    raise OSError("Could not load SoundFont '%s'." % soundfont)
+            self._idle.put(synth)
+
+        self.pool = ThreadPool(threads)
+
+    def delete(self):
+        """Stop the worker threads and delete the synths."""
+        if getattr(self, 'pool', None) is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        for synth in self.synths:
+            synth.delete()
+
+        self.synths = []
+
+    def _run(self, func, job):
+        synth = self._idle.get()
+        try:
+            return func(synth, job)
+        finally:
+            synth.system_reset()
+            self._idle.put(synth)
+
+    def map(self, func, jobs):
+        """Run ``func(synth, job)`` for each job in parallel.
+
+        Synths are reset with ``Synth.system_reset()`` after each job.
+
+        :param func: Python callable taking a synth and a job
+        :param jobs: job descriptions passed to ``func``
+        :type jobs: iterable
+        :return: results of ``func`` in the order of ``jobs``
+        :rtype: ``list``
+
+        """
+        return self.pool.map(lambda job: self._run(func, job), jobs, chunksize=1)
+
+    def render_events(self, smfs, **kwargs):
+        """Render parsed MIDI files with ``Synth.render_events()`` in parallel.
+
+        :param smfs: parsed MIDI files as returned by ``parse_smf()``
+        :type smfs: iterable of ``SMF``
+        :return: sample frames of each MIDI file
+        :rtype: ``list`` of NumPy arrays
+
+        Keyword arguments are passed to ``Synth.render_events()``.
+
+        """
+        def render(synth, smf):
+            return synth.render_events(smf.events, smf.division, smf.tempo_map, **kwargs)
+
+        return self.map(render, smfs)
+
+    def render_smf(self, datas, **kwargs):
+        """Render SMF data with the FluidSynth MIDI player in parallel.
+
+        :param datas: SMF data of each job
+        :type datas: iterable of ``bytes`` or other buffer objects
+        :return: sample frames of each MIDI file
+        :rtype: ``list`` of NumPy arrays
+
+        Keyword arguments are passed to ``Player.render_to_array()``.
+
+        """
+        def render(synth, data):
+            player = Player(synth)
+            try:
+                player.add_mem(data)
+                player.play()
+                return player.render_to_array(**kwargs)
+            finally:
+                player.delete()
+
+        return self.map(render, datas)
+
+
+class MixBus(object):
+    """Mixes the output of several synths into one stereo stream.
+
+    On every period, a block is pulled from each registered synth, scaled by
+    its gain and pan and added into one preallocated output buffer, which is
+    then handed to a single sink (e.g. a ``StreamSink`` writing to an audio
+    device or pipe). The render time of each synth is measured per period.
+
+    """
+
+    def __init__(self, period_size=512, samplerate=44100.0):
+        """Create new mixing bus.
+
+        :param period_size: number of sample frames per period
+        :type period_size: ``int``
+        :param samplerate: sample rate in Hz of all registered synths
+        :type samplerate: ``float``
+
+        """
+        import numpy
+        self.period_size = period_size
+        self.samplerate = float(samplerate)
+        self.out = numpy.zeros((period_size, 2), dtype=numpy.float32)
+        self._scratch = numpy.empty((period_size, 2), dtype=numpy.float32)
+        self.inputs = []  # list of [synth, channel gains, timing stats]
+        self.periods = 0
+        self.overruns = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+    @staticmethod
+    def _channel_gains(gain, pan):
+        """Return constant-power left / right gains for a pan of -1.0 (left) to 1.0 (right)."""
+        import numpy
+        angle = (min(max(pan, -1.0), 1.0) + 1.0) * math.pi / 4
+        return numpy.array([gain * math.cos(angle), gain * math.sin(angle)],
+                           dtype=numpy.float32) * numpy.float32(math.sqrt(2))
+
+    def _find(self, synth):
+        for entry in self.inputs:
+            if entry[0] is synth:
+                return entry
+
+        raise KeyError("Synth is not registered with this mixing bus.")
+
+    def add(self, synth, gain=1.0, pan=0.0):
+        """Register a synth.
+
+        :param synth: an instance of class Synth, not started with ``start()``
+        :param gain: linear gain
+        :type gain: ``float``
+        :param pan: stereo position from -1.0 (left) over 0.0 (center, unity
+            gain) to 1.0 (right)
+        :type pan: ``float``
+
+        """
+        with self._lock:
+            self.inputs.append([synth, self._channel_gains(gain, pan),
+                                {'gain': gain, 'pan': pan, 'periods': 0, 'total': 0.0,
+                                 'max': 0.0, 'last': 0.0}])
+
+    def remove(self, synth):
+        """Unregister a synth."""
+        with self._lock:
+            self.inputs.remove(self._find(synth))
+
+    def set_gain(self, synth, gain=None, pan=None):
+        """Change gain and / or pan of a registered synth."""
+        with self._lock:
+            entry = self._find(synth)
+            if gain is not None:
+                entry[2]['gain'] = gain
+            if pan is not None:
+                entry[2]['pan'] = pan
+            entry[1] = self._channel_gains(entry[2]['gain'], entry[2]['pan'])
+
+    def process(self):
+        """Render and mix one period.
+
+        :return: the mixed sample frames. The buffer is reused for the next
+            period.
+        :rtype: ``np.array(..., dtype=numpy.float32)`` of shape ``(period_size, 2)``
+
+        """
+        import numpy
+        out = self.out
+        scratch = self._scratch
+        out.fill(0.0)
+
+        with self._lock:
+            inputs = list(self.inputs)
+
+        for synth, gains, stats in inputs:
+            start = default_timer()
+            fluid_synth_write_float_stereo(synth.synth, self.period_size, scratch)
+            elapsed = default_timer() - start
+            numpy.multiply(scratch, gains, out=scratch)
+            out += scratch
+            stats['last'] = elapsed
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['periods'] += 1
+
+        self.periods += 1
+        return out
+
+    def start(self, sink, realtime=True):
+        """Start rendering periods into a sink in a background thread.
+
+        :param sink: sink receiving a copy of each mixed period
+        :type sink: ``Sink``
+        :param realtime: whether to pace the periods by the system clock.
+            Disable for sinks which block until the audio device needs more
+            data.
+        :type realtime: ``bool``
+
+        """
+        if self._thread is not None:
+            raise RuntimeError("Mixing bus is already running.")
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(sink, realtime),
+                                        name='fluidsynth-mixbus')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, sink, realtime):
+        period = self.period_size / self.samplerate
+        deadline = default_timer()
+
+        while self._running:
+            sink.write(self.process().copy())
+
+            if realtime:
+                deadline += period
+                delay = deadline - default_timer()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    # Period took longer than realtime
+                    self.overruns += 1
+                    deadline = default_timer()
+
+    def stop(self):
+        """Stop the background thread started with ``start()``."""
+        if self._thread is not None:
+            self._running = False
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        """Return render timing statistics.
+
+        :return: ``dict`` with the ``period`` length in seconds, number of
+            ``periods`` and ``overruns`` and a list of per-synth ``inputs``
+            statistics: ``gain``, ``pan``, ``periods``, ``last``, ``mean``
+            and ``max`` render time per period in seconds and ``load``, the
+            mean render time as a fraction of the period
+
+        """
+        period = self.period_size / self.samplerate
+        inputs = []
+
+        with self._lock:
+            for synth, gains, stats in self.inputs:
+                mean = stats['total'] / stats['periods'] if stats['periods'] else 0.0
+                inputs.append(dict(stats, synth=synth, mean=mean, load=mean / period))
+
+        return {'period': period, 'periods': self.periods, 'overruns': self.overruns,
+                'inputs': inputs}
+
+
+class SynthPool(object):
+    """Pool of ready-to-use synths for request / response style rendering.
+
+    Synths are created with the given settings and soundfonts up front.
+    Returned synths are reset (``Synth.system_reset()``, which also clears
+    the reverb and chorus buffers), get their initial reverb and chorus
+    parameters and programs restored and are then kept for reuse. Synths
+    idle for longer than ``max_idle`` seconds are deleted on the next
+    ``checkout()`` or ``checkin()``, as long as at least ``min_size`` synths
+    remain.
+
+    """
+
+    def __init__(self, soundfonts, size=4, min_size=None, programs=None, max_idle=300.0,
+                 **kwargs):
+        """Create the pool and its initial synths.
+
+        :param soundfonts: SoundFont file names / paths to load into each synth
+        :type soundfonts: sequence of ``str``
+        :param size: maximum number of synths
+        :type size: ``int``
+        :param min_size: number of synths kept ready even when idle, defaults
+            to ``size``
+        :type min_size: ``int``
+        :param programs: programs selected after creation and each reset, as
+            ``(chan, soundfont index, bank, preset)`` tuples, where the index
+            refers to ``soundfonts``
+        :type programs: sequence of ``tuple``
+        :param max_idle: time in seconds after which idle synths are deleted
+        :type max_idle: ``float``
+
+        Other keyword arguments are passed to the ``Synth`` constructor.
+
+        """
+        if isinstance(soundfonts, (text_type, binary_type)):
+            soundfonts = [soundfonts]
+
+        self.soundfonts = list(soundfonts)
+        self.size = size
+        self.min_size = size if min_size is None else min(min_size, size)
+        self.programs = list(programs or [])
+        self.max_idle = max_idle
+        self.kwargs = kwargs
+        self._idle = deque()  # (synth, time returned to the pool)
+        self._count = 0  # number of synths owned by the pool
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.expired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+        for _ in range(self.min_size):
+            self._idle.append((self._create(), default_timer()))
+            self._count += 1
+            self.created += 1
+
+    def _create(self):
+        """Create and prepare a new synth."""
+        synth = Synth(**self.kwargs)
+        sfids = []
+
+        for soundfont in self.soundfonts:
+            sfid = synth.sfload(soundfont)
+            if sfid == FLUID_FAILED:
+                synth.delete()
+                raise OSError("Could not load SoundFont '%s'." % soundfont)
+            sfids.append(sfid)
+
+        synth._pool_state = (sfids,
+                             (synth.get_reverb_roomsize(), synth.get_reverb_damp(),
+                              synth.get_reverb_width(), synth.get_reverb_level()),
+                             (synth.get_chorus_nr(), synth.get_chorus_level(),
+                              synth.get_chorus_speed(), synth.get_chorus_depth(),
+                              synth.get_chorus_type()))
+        self._select_programs(synth)
+        return synth
+
+    def _select_programs(self, synth):
+        sfids = synth._pool_state[0]
+        for chan, index, bank, preset in self.programs:
+            synth.program_select(chan, sfids[index], bank, preset)
+
+    def _reset(self, synth):
+        """Bring a returned synth back to its initial state."""
+        sfids, reverb, chorus = synth._pool_state
+        synth.system_reset()
+        synth.set_reverb(*reverb)
+        synth.set_chorus(*chorus)
+        self._select_programs(synth)
+
+    def healthy(self, synth):
+        """Return whether a synth is usable: still alive with all soundfonts loaded."""
+        if not synth.synth:
+            return False
+
+        return all(fluid_synth_get_sfont_by_id(synth.synth, sfid)
+                   for sfid in synth._pool_state[0])
+
+    def _expire(self, now):
+        """Delete synths idle for too long, oldest first (called with lock held)."""
+        while (self._idle and self._count > self.min_size and
+               now - self._idle[0][1] > self.max_idle):
+            self._idle.popleft()[0].delete()
+            self._count -= 1
+            self.expired += 1
+
+    def checkout(self, timeout=None):
+        """Take a ready synth from the pool, waiting if all synths are in use.
+
+        :param timeout: maximum time to wait in seconds
+        :type timeout: ``float``
+        :return: an instance of class Synth, to be returned with ``checkin()``
+        :raises RuntimeError: if no synth became available within ``timeout``
+
+        """
+        start = default_timer()
+        create = False
+
+        with self._cond:
+            while True:
+                self._expire(default_timer())
+
+                while self._idle:
+                    # Most recently returned synth first, so unused ones expire
+                    synth = self._idle.pop()[0]
+                    if self.healthy(synth):
+                        break
+                    synth.delete()
+                    self._count -= 1
+                    self.discarded += 1
+                else:
+                    synth = None
+
+                if synth is not None:
+                    break
+
+                if self._count < self.size:
+                    # Reserve a slot, the synth is created without holding the lock
+                    self._count += 1
+                    create = True
+                    break
+
+                remaining = None if timeout is None else start + timeout - default_timer()
+                if remaining is not None and remaining <= 0:
+                    raise RuntimeError("No synth available within %.3f seconds." % timeout)
+
+                self._cond.wait(remaining)
+
+        if create:
+            try:
+                synth = self._create()
+            except Exception:
+                with self._cond:
+                    self._count -= 1
+                    self._cond.notify()
+                raise
+
+        with self._cond:
+            if create:
+                self.created += 1
+
+            wait = default_timer() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+        return synth
+
+    def checkin(self, synth):
+        """Reset a synth and return it to the pool."""
+        try:
+            self._reset(synth)
+            healthy = self.healthy(synth)
+        except Exception:
+            healthy = False
+
+        with self._cond:
+            now = default_timer()
+
+            if healthy:
+                self._idle.append((synth, now))
+            else:
+                synth.delete()
+                self._count -= 1
+                self.discarded += 1
+
+            self._expire(now)
+            self._cond.notify()
+
+    def session(self, timeout=None):
+        """Return a context manager checking out a synth and returning it afterwards.
+
+        Example::
+
+            with pool.session() as synth:
+                audio = synth.render_events(events)
+
+        """
+        @contextmanager
+        def session():
+            synth = self.checkout(timeout)
+            try:
+                yield synth
+            finally:
+                self.checkin(synth)
+
+        return session()
+
+    def close(self):
+        """Delete all idle synths. Synths still checked out are not affected."""
+        with self._cond:
+            while self._idle:
+                self._idle.pop()[0].delete()
+                self._count -= 1
+
+    def stats(self):
+        """Return pool metrics.
+
+        :return: ``dict`` with the number of synths (``size``) and ``idle``
+            synths, ``checkouts``, synths ``created``, ``discarded`` after
+            failed health checks and ``expired``, and the mean and maximum
+            checkout wait time in seconds (``wait_mean``, ``wait_max``)
+
+        """
+        with self._cond:
+            return {
+                'size': self._count,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'discarded': self.discarded,
+                'expired': self.expired,
+                'wait_mean': self.wait_total / self.checkouts if self.checkouts else 0.0,
+                'wait_max': self.wait_max,
+            }
+
+
+class RenderObserver(object):
+    """Base class of objects notified of the block render times of a synth.
+
+    Observers are chained through ``Synth.render_observer``, so several can
+    be attached to the same synth. Subclasses implement ``block_rendered()``.
+
+    """
+
+    def __init__(self, synth):
+        self.synth = synth
+        self._previous = None  # next observer in the chain
+        self._linked = False  # whether in the observer chain of the synth
+        self._active = False
+
+    def observe(self, seconds, frames):
+        """Pass a block render time on (``Synth.render_observer`` interface)."""
+        if self._previous is not None:
+            self._previous(seconds, frames)
+
+        if self._active:
+            self.block_rendered(seconds, frames)
+
+    def block_rendered(self, seconds, frames):
+        """Handle a block of ``frames`` sample frames rendered in ``seconds``."""
+        raise NotImplementedError
+
+    def attach(self):
+        """Start observing, keeping any observers attached before."""
+        if not self._linked:
+            self._previous = self.synth.render_observer
+            self.synth.render_observer = self.observe
+            self._linked = True
+
+        self._active = True
+
+    def detach(self):
+        """Stop observing.
+
+        If observers were attached later, this one stays in the chain, only
+        passing block render times on to the earlier observers.
+
+        """
+        self._active = False
+
+        # Unlink this and any detached observers from the head of the chain
+        while True:
+            head = self.synth.render_observer
+            owner = getattr(head, '__self__', None)
+
+            if not (isinstance(owner, RenderObserver) and owner._linked and
+                    not owner._active and head == owner.observe):
+                break
+
+            self.synth.render_observer = owner._previous
+            owner._previous = None
+            owner._linked = False
+
+
+class MetricsSampler(RenderObserver):
+    """Periodic recorder of synth performance metrics.
+
+    Samples of ``Synth.metrics()`` are kept in a fixed-size ring buffer, and
+    the render time of every block generated through ``get_samples()``,
+    ``get_samples_float()`` or ``stream()`` goes into a latency histogram,
+    as do the render times reported while an audio driver runs (see
+    ``Synth.start()``).
+    Metrics can be exported as a ``dict`` or in Prometheus text format, to a
+    callback and / or a file after every sample.
+
+    """
+
+    # Upper bounds of the block render latency histogram buckets in seconds
+    BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+    def __init__(self, synth, interval=1.0, size=600, buckets=None, callback=None,
+                 filename=None, format='dict', prefix='fluidsynth'):
+        """Create a sampler for a synth and start observing its block timings.
+
+        :param synth: synth to observe
+        :type synth: ``Synth``
+        :param interval: time between samples in seconds when started
+        :type interval: ``float``
+        :param size: number of samples kept in the ring buffer
+        :type size: ``int``
+        :param buckets: histogram bucket upper bounds in seconds, defaults to
+            ``BUCKETS``
+        :type buckets: sequence of ``float``
+        :param callback: called after every sample with the exported metrics
+        :type callback: callable
+        :param filename: file rewritten (atomically) after every sample with
+            the exported metrics, e.g. for the Prometheus node exporter
+            textfile collector
+        :type filename: ``str``
+        :param format: export format for ``callback``: ``'dict'`` or
+            ``'prometheus'``. Files are always written in Prometheus format.
+        :type format: ``str``
+        :param prefix: Prometheus metric name prefix
+        :type prefix: ``str``
+
+        """
+        import numpy
+
+        if format not in ('dict', 'prometheus'):
+            raise ValueError("Unknown export format '%s'." % format)
+
+        super(MetricsSampler, self).__init__(synth)
+        self.interval = interval
+        self.callback = callback
+        self.filename = filename
+        self.format = format
+        self.prefix = prefix
+        self.buckets = numpy.array(sorted(buckets or self.BUCKETS), dtype=numpy.float64)
+        self.ring = numpy.zeros(size, dtype=[('time', '<f8'), ('cpu_load', '<f8'),
+                                             ('active_voices', '<i4'), ('polyphony', '<i4'),
+                                             ('last_block_time', '<f8')])
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.reset()
+        self.attach()
+
+    def reset(self):
+        """Clear the ring buffer and histogram."""
+        import numpy
+
+        with self._lock:
+            self.count = 0  # samples taken
+            self.histogram = numpy.zeros(len(self.buckets) + 1, dtype=numpy.int64)
+            self.latency_sum = 0.0
+
+    def block_rendered(self, seconds, frames):
+        """Add a block render time to the histogram."""
+        with self._lock:
+            self.histogram[self.buckets.searchsorted(seconds)] += 1
+            self.latency_sum += seconds
+
+    def sample(self):
+        """Record a sample of the synth metrics now and export.
+
+        :return: the metrics ``dict`` of the sample
+
+        """
+        metrics = self.synth.metrics()
+
+        with self._lock:
+            self.ring[self.count % len(self.ring)] = (
+                default_timer(), metrics['cpu_load'], metrics['active_voices'],
+                metrics['polyphony'], metrics['last_block_time'])
+            self.count += 1
+
+        if self.callback is not None:
+            self.callback(self.prometheus() if self.format == 'prometheus' else self.as_dict())
+
+        if self.filename is not None:
+            self.write(self.filename)
+
+        return metrics
+
+    def samples(self):
+        """Return the samples in the ring buffer, oldest first.
+
+        :return: structured NumPy array with fields ``time``, ``cpu_load``,
+            ``active_voices``, ``polyphony`` and ``last_block_time``
+
+        """
+        import numpy
+
+        with self._lock:
+            size = len(self.ring)
+            if self.count <= size:
+                return self.ring[:self.count].copy()
+            return numpy.roll(self.ring, -(self.count % size))
+
+    def as_dict(self):
+        """Return the current metrics, sample statistics and latency histogram.
+
+        :return: ``dict`` with the fields of ``Synth.metrics()``, the number
+            of ``samples`` and the ``mean`` and ``max`` CPU load and active
+            voices over the ring buffer, and ``latency`` with cumulative
+            histogram ``buckets`` as ``(upper bound, count)`` pairs (the last
+            bound is ``inf``), ``sum`` and ``count``
+
+        """
+        samples = self.samples()
+        result = self.synth.metrics()
+        result['samples'] = len(samples)
+
+        for field in ('cpu_load', 'active_voices'):
+            values = samples[field]
+            result[field + '_mean'] = float(values.mean()) if len(values) else 0.0
+            result[field + '_max'] = float(values.max()) if len(values) else 0.0
+
+        with self._lock:
+            counts = self.histogram.cumsum()
+            latency_sum = self.latency_sum
+
+        bounds = list(self.buckets) + [float('inf')]
+        result['latency'] = {
+            'buckets': [(float(b), int(c)) for b, c in zip(bounds, counts)],
+            'sum': latency_sum,
+            'count': int(counts[-1]),
+        }
+        return result
+
+    def prometheus(self):
+        """Return the current metrics in Prometheus text exposition format."""
+        data = self.as_dict()
+        prefix = self.prefix
+        lines = []
+
+        for name, kind, value, help in (
+                ('cpu_load', 'gauge', data['cpu_load'], 'Synthesis CPU load in percent'),
+                ('active_voices', 'gauge', data['active_voices'], 'Number of active voices'),
+                ('polyphony', 'gauge', data['polyphony'], 'Maximum number of voices'),
+                ('blocks_total', 'counter', data['blocks'], 'Number of rendered blocks'),
+                ('frames_total', 'counter', data['frames'], 'Number of rendered frames')):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            lines.append('%s_%s %s' % (prefix, name, repr(value)))
+
+        name = prefix + '_block_render_seconds'
+        lines.append('# HELP %s Block render time in seconds' % name)
+        lines.append('# TYPE %s histogram' % name)
+        for bound, count in data['latency']['buckets']:
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('%s_bucket{le="%s"} %d' % (name, le, count))
+        lines.append('%s_sum %s' % (name, repr(data['latency']['sum'])))
+        lines.append('%s_count %d' % (name, data['latency']['count']))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, filename):
+        """Atomically write the metrics in Prometheus format to a file."""
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.prometheus())
+        getattr(os, 'replace', os.rename)(tmp, filename)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        """Start sampling every ``interval`` seconds in a background thread."""
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and detach from the synth."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+        self.detach()
+
+
+class PolyphonyController(RenderObserver):
+    """Adapts the polyphony of a synth to its CPU load.
+
+    The load is the larger of the FluidSynth CPU load and the render time
+    of the last block relative to its duration (both in percent). When it
+    stays above ``high_load`` for ``hold`` consecutive updates, polyphony is
+    reduced by the factor ``decrease``. When it stays below ``low_load``,
+    polyphony is raised by ``increase`` voices again. It always stays within
+    ``min_polyphony`` and ``max_polyphony``.
+
+    Once attached, the controller is updated after every block generated
+    with ``get_samples()``, ``get_samples_float()`` or ``stream()``, after
+    every period of an audio driver started with ``callback`` or
+    ``observe=True``, and every ``poll_interval`` seconds while a native audio
+    driver started with ``Synth.start()`` runs.
+
+    """
+
+    def __init__(self, synth, min_polyphony=16, max_polyphony=None, high_load=80.0,
+                 low_load=50.0, hold=8, decrease=0.75, increase=8, max_log=100):
+        """Create a controller for a synth.
+
+        :param synth: synth to control
+        :type synth: ``Synth``
+        :param min_polyphony: lower polyphony bound
+        :type min_polyphony: ``int``
+        :param max_polyphony: upper polyphony bound, defaults to the current
+            polyphony of the synth
+        :type max_polyphony: ``int``
+        :param high_load: load in percent above which voices are shed
+        :type high_load: ``float``
+        :param low_load: load in percent below which voices are restored
+        :type low_load: ``float``
+        :param hold: number of consecutive updates beyond a threshold before
+            adjusting
+        :type hold: ``int``
+        :param decrease: factor applied to polyphony when shedding voices
+        :type decrease: ``float``
+        :param increase: number of voices added when restoring
+        :type increase: ``int``
+        :param max_log: number of adjustments kept in ``adjustments``
+        :type max_log: ``int``
+
+        """
+        if not low_load < high_load:
+            raise ValueError("low_load must be smaller than high_load.")
+
+        super(PolyphonyController, self).__init__(synth)
+        self.samplerate = synth.setting('synth.sample-rate')
+        self.polyphony = synth.get_polyphony()
+        self.min_polyphony = min_polyphony
+        self.max_polyphony = self.polyphony if max_polyphony is None else max_polyphony
+        self.high_load = high_load
+        self.low_load = low_load
+        self.hold = hold
+        self.decrease = decrease
+        self.increase = increase
+        # (time, old polyphony, new polyphony, load) of recent adjustments
+        self.adjustments = deque(maxlen=max_log)
+        # Estimated number of voices cut off by lowering polyphony
+        self.stolen = 0
+        self._over = 0
+        self._under = 0
+
+    def load(self, seconds, frames):
+        """Return the load in percent for a block of ``frames`` rendered in ``seconds``."""
+        block_load = 100.0 * seconds * self.samplerate / frames if frames else 0.0
+        return max(fluid_synth_get_cpu_load(self.synth.synth), block_load)
+
+    def block_rendered(self, seconds, frames):
+        """Update with the render time of a block."""
+        self.update(self.load(seconds, frames))
+
+    def update(self, load):
+        """Update with a load measurement in percent, adjusting polyphony if needed.
+
+        :return: the polyphony after the update
+
+        """
+        if load > self.high_load:
+            self._over += 1
+            self._under = 0
+        elif load < self.low_load:
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = self._under = 0
+
+        if self._over >= self.hold:
+            self._over = 0
+            self._set(max(self.min_polyphony, int(self.polyphony * self.decrease)), load)
+        elif self._under >= self.hold:
+            self._under = 0
+            self._set(min(self.max_polyphony, self.polyphony + self.increase), load)
+
+        return self.polyphony
+
+    def _set(self, polyphony, load):
+        if polyphony == self.polyphony:
+            return
+
+        active = fluid_synth_get_active_voice_count(self.synth.synth)
+        fluid_synth_set_polyphony(self.synth.synth, polyphony)
+        self.stolen += max(0, active - polyphony)
+        self.adjustments.append((default_timer(), self.polyphony, polyphony, load))
+        logging.getLogger(__name__).info(
+            "Polyphony %s from %d to %d voices at %.1f%% load (%d active)",
+            'lowered' if polyphony < self.polyphony else 'raised',
+            self.polyphony, polyphony, load, active)
+        self.polyphony = polyphony
+
+    def detach(self, restore=True):
+        """Stop updating and optionally restore the maximum polyphony."""
+        super(PolyphonyController, self).detach()
+
+        if restore:
+            self._set(self.max_polyphony, 0.0)
+
+
+class EffectStems(object):
+    """Dry / effects split render of channel events for re-mixing effect levels.
+
+    The dry signal and the reverb and chorus outputs are rendered separately
+    with ``fluid_synth_process()`` (requires FluidSynth 2.1 or newer for
+    separate effect buffers) into float32 stems of shape (2, frames), kept
+    in memory or as memory-mapped ``.npy`` files in ``directory``.
+
+    Effects are rendered at level 1.0, so mixes with any dry gain and reverb
+    and chorus level are computed with NumPy only. A stem is re-rendered
+    only for reverb room parameters (room size, damping, width) or chorus
+    parameters (voice count, speed, depth, type) not rendered before.
+
+    """
+
+    def __init__(self, soundfonts, events, division=480, tempo_map=None, directory=None,
+                 tail=4.0, block_size=1024, **kwargs):
+        """Prepare a split render of channel events.
+
+        :param soundfonts: SoundFont file names / paths to load
+        :type soundfonts: sequence of ``str``
+        :param events: channel events, e.g. as returned by ``parse_smf()``
+        :type events: NumPy structured array (``SMF_EVENT_DTYPE``)
+        :param division: time division in ticks per quarter note
+        :type division: ``int``
+        :param tempo_map: tempo changes (``SMF_TEMPO_DTYPE`` records) or a
+            ``TempoMap`` instance. Defaults to a constant tempo of 120 BPM.
+        :param directory: directory for stem files. File names include a
+            hash of the events, the soundfonts (path, size and modification
+            time) and the audio settings, so stems rendered by an earlier
+            instance with the same events and settings are reused. Stems are
+            kept in memory if not given.
+        :type directory: ``str``
+        :param tail: time in seconds rendered after the last event, so
+            reverb tails fit in
+        :type tail: ``float``
+        :param block_size: number of sample frames rendered per call into
+            FluidSynth
+        :type block_size: ``int``
+
+        Other keyword arguments are passed to the ``Synth`` constructor.
+
+        """
+        import numpy
+
+        if isinstance(soundfonts, (text_type, binary_type)):
+            soundfonts = [soundfonts]
+
+        self.soundfonts = list(soundfonts)
+        self.directory = directory
+        self.block_size = block_size
+        self.kwargs = kwargs
+        self.renders = 0
+        self._stems = {}
+
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        synth = Synth(**kwargs)
+        self.samplerate = synth.setting('synth.sample-rate')
+        # Default effect parameters in set_reverb() / set_chorus() order
+        self.default_reverb = (synth.get_reverb_roomsize(), synth.get_reverb_damp(),
+                               synth.get_reverb_width(), synth.get_reverb_level())
+        self.default_chorus = (synth.get_chorus_nr(), synth.get_chorus_level(),
+                               synth.get_chorus_speed(), synth.get_chorus_depth(),
+                               synth.get_chorus_type())
+        audio_settings = sorted(iteritems(synth.audio_settings()))
+        synth.delete()
+
+        if not isinstance(tempo_map, TempoMap):
+            tempo_map = TempoMap(tempo_map if tempo_map is not None else [], division)
+
+        seconds = numpy.atleast_1d(tempo_map.ticks_to_seconds(events['tick']))
+        frames = numpy.rint(seconds * self.samplerate).astype(numpy.int64)
+        order = numpy.argsort(frames, kind='mergesort')
+        self.events = events[order]
+        self.event_frames = frames[order]
+        self.frames = ((int(frames[-1]) if len(frames) else 0) +
+                       int(round(tail * self.samplerate)))
+
+        # Identifies everything but the effect parameters in stem file names
+        digest = hashlib.sha256()
+        digest.update(self.events.tobytes())
+        digest.update(self.event_frames.tobytes())
+        soundfont_ids = []
+        for soundfont in self.soundfonts:
+            stat = os.stat(soundfont)
+            soundfont_ids.append((os.path.abspath(soundfont), stat.st_size, stat.st_mtime))
+        meta = (
+            api_version,
+            _d(fluid_version_str()) if fluid_version_str else None,
+            self.frames,
+            soundfont_ids,
+            audio_settings,
+        )
+        digest.update(_e(repr(meta)))
+        self._render_id = digest.hexdigest()
+
+    def _params(self, given, defaults):
+        """Fill in defaults for missing (``None`` or negative) effect parameters."""
+        if given is None:
+            return defaults
+
+        given = tuple(given) + (None,) * (len(defaults) - len(given))
+        return tuple(d if v is None or v < 0 else v for v, d in zip(given, defaults))
+
+    def _keys(self, reverb, chorus):
+        """Return stem keys for complete reverb and chorus parameter tuples."""
+        return ('dry',), ('reverb',) + tuple(reverb[:3]), ('chorus', chorus[0]) + tuple(chorus[2:])
+
+    def _filename(self, key):
+        digest = hashlib.sha1(_e(self._render_id + repr(key))).hexdigest()[:16]
+        return os.path.join(self.directory, '%s-%s.npy' % (key[0], digest))
+
+    def _lookup(self, key):
+        """Return a rendered stem or ``None``."""
+        stem = self._stems.get(key)
+
+        if stem is None and self.directory is not None:
+            import numpy
+
+            filename = self._filename(key)
+            if os.path.exists(filename):
+                stem = self._stems[key] = numpy.load(filename, mmap_mode='r')
+
+        return stem
+
+    def _allocate(self, key):
+        import numpy
+
+        if self.directory is None:
+            return numpy.zeros((2, self.frames), dtype=numpy.float32)
+
+        from numpy.lib.format import open_memmap
+
+        # New files are zero-filled, as fluid_synth_process() adds to buffers
+        return open_memmap(self._filename(key) + '.tmp', mode='w+', dtype=numpy.float32,
+                           shape=(2, self.frames))
+
+    def stems(self, reverb=None, chorus=None):
+        """Return the dry, reverb and chorus stems, rendering missing ones.
+
+        :param reverb: reverb parameters in ``Synth.set_reverb()`` order
+            (roomsize, damping, width, level). Missing or negative values
+            take the synth defaults; the level is ignored.
+        :type reverb: ``tuple``
+        :param chorus: chorus parameters in ``Synth.set_chorus()`` order
+            (nr, level, speed, depth, type), handled like ``reverb``
+        :type chorus: ``tuple``
+        :return: ``(dry, reverb, chorus)`` arrays of shape (2, frames)
+
+        """
+        reverb = self._params(reverb, self.default_reverb)
+        chorus = self._params(chorus, self.default_chorus)
+        keys = self._keys(reverb, chorus)
+        stems = [self._lookup(key) for key in keys]
+
+        if any(stem is None for stem in stems):
+            targets = [None if stem is not None else self._allocate(key)
+                       for key, stem in zip(keys, stems)]
+            try:
+                self._render(reverb, chorus, targets)
+            except Exception:
+                # Do not leave partial stem files behind
+                filenames = [target.filename for target in targets
+                             if target is not None and self.directory is not None]
+                del targets[:]
+                for filename in filenames:
+                    os.remove(filename)
+                raise
+
+            for i, (key, target) in enumerate(zip(keys, targets)):
+                if target is None:
+                    continue
+
+                if self.directory is not None:
+                    filename = target.filename
+                    target.flush()
+                    del target
+                    getattr(os, 'replace', os.rename)(filename, self._filename(key))
+                    self._stems.pop(key, None)
+                    stems[i] = self._lookup(key)
+                else:
+                    stems[i] = self._stems[key] = target
+
+        return tuple(stems)
+
+    def _render(self, reverb, chorus, targets):
+        """Render the events into ``targets`` (dry, reverb, chorus; ``None`` to discard)."""
+        import numpy
+
+        synth = Synth(**self.kwargs)
+        for soundfont in self.soundfonts:
+            if synth.sfload(soundfont) == FLUID_FAILED:
+                synth.delete()
+                raise OSError("Could not load SoundFont '%s'." % soundfont)
+
+        synth.set_reverb(reverb[0], reverb[1], reverb[2], 1.0)
+        synth.set_chorus(chorus[0], 1.0, chorus[2], chorus[3], chorus[4])
+
+        block_size = self.block_size
+        scratch = numpy.zeros((2 * len(targets), block_size), dtype=numpy.float32)
+        out = (c_void_p * 2)()
+        fx = (c_void_p * 4)()
+        pointers = [(out, 0), (fx, 0), (fx, 2)]
+        dispatch = synth._event_dispatch()
+        frames = self.frames
+
+        def process(pos, end):
+            while pos < end:
+                count = min(block_size, end - pos)
+
+                for i, (target, (array, index)) in enumerate(zip(targets, pointers)):
+                    if target is None:
+                        scratch[2 * i:2 * i + 2] = 0
+                        addr, stride = scratch.ctypes.data + 2 * i * block_size * 4, block_size
+                    else:
+                        addr, stride = target.ctypes.data + pos * 4, frames
+                    array[index] = addr
+                    array[index + 1] = addr + stride * 4
+
+                if fluid_synth_process(synth.synth, count, 4, fx, 2, out) != FLUID_OK:
+                    raise RuntimeError("Could not render separate effect outputs, "
+                                       "FluidSynth 2.1 or newer is required.")
+                pos += count
+
+        pos = 0
+        try:
+            for frame, kind, chan, p1, p2 in zip(self.event_frames.tolist(),
+                                                 self.events['type'].tolist(),
+                                                 self.events['chan'].tolist(),
+                                                 self.events['p1'].tolist(),
+                                                 self.events['p2'].tolist()):
+                if frame > pos:
+                    process(pos, frame)
+                    pos = frame
+
+                handler = dispatch.get(kind)
+                if handler is not None:
+                    handler(chan, p1, p2)
+
+            process(pos, frames)
+        finally:
+            synth.delete()
+
+        self.renders += 1
+
+    def mix(self, dry=1.0, reverb=None, chorus=None, out=None):
+        """Mix the stems, rendering only stems for new effect parameters.
+
+        :param dry: gain of the dry signal
+        :type dry: ``float``
+        :param reverb: reverb parameters as for ``stems()``; the level (which
+            defaults to the synth default) is applied as a gain
+        :type reverb: ``tuple``
+        :param chorus: chorus parameters as for ``stems()``, the level is
+            applied as a gain
+        :type chorus: ``tuple``
+        :param out: optional preallocated ``float32`` array of shape
+            ``(frames, 2)`` to write the mix to
+        :return: stereo sample frames
+        :rtype: ``np.array(..., dtype=numpy.float32)`` of shape ``(frames, 2)``
+
+        """
+        import numpy
+
+        reverb = self._params(reverb, self.default_reverb)
+        chorus = self._params(chorus, self.default_chorus)
+        stems = self.stems(reverb, chorus)
+
+        if out is None:
+            out = numpy.empty((self.frames, 2), dtype=numpy.float32)
+
+        planar = out.T
+        numpy.multiply(stems[0], dry, out=planar)
+        scaled = numpy.empty((2, self.frames), dtype=numpy.float32)
+
+        for stem, gain in ((stems[1], reverb[3]), (stems[2], chorus[1])):
+            if gain:
+                numpy.multiply(stem, gain, out=scaled)
+                planar += scaled
+
+        return out
+
+
+# Note dataset generation
+
+# Note dataset index record
+DATASET_INDEX_DTYPE = [('bank', '<i4'), ('preset', '<i4'), ('pitch', '<i4'), ('velocity', '<i4'),
+                       ('shard', '<i4'), ('row', '<i4')]
+
+# Per-process synth of the dataset worker pool
+_dataset_synth = None
+
+
+def _dataset_worker_init(soundfont, samplerate, kwargs):
+    """Create the warm synth of a dataset worker process.
+
+    Failures are not raised here, since the pool would keep restarting
+    failing workers; ``_dataset_render_shard()`` reports them instead.
+
+    """
+    global _dataset_synth
+    _dataset_synth = Synth(samplerate=samplerate, **kwargs)
+
+    if _dataset_synth.sfload(soundfont) == FLUID_FAILED:
+        _dataset_synth.delete()
+        _dataset_synth = None
+
+
+def _dataset_render_shard(task):
+    """Render one shard of clips into a ``.npy`` file in a worker process."""
+    import numpy
+    shard, items, duration, clip_frames, filename = task
+    synth = _dataset_synth
+
+    if synth is None:
+        raise OSError("Worker could not load the SoundFont.")
+
+    sfid = next(iter(synth.soundfonts))
+    tmp = filename + '.tmp.npy'
+    clips = numpy.lib.format.open_memmap(tmp, mode='w+', dtype=numpy.float32,
+                                         shape=(len(items), clip_frames, 2))
+    max_release = float(clip_frames) / synth.setting('synth.sample-rate') - duration
+
+    for row, (bank, preset, pitch, vel) in enumerate(items):
+        synth.program_select(0, sfid, bank, preset)
+        audio = synth.render_note(0, pitch, vel, duration, max_release=max(max_release, 0.0))
+        count = min(len(audio), clip_frames)
+        clips[row, :count] = audio[:count]
+        clips[row, count:] = 0.0
+        synth.system_reset()
+
+    clips.flush()
+    del clips
+    getattr(os, 'replace', os.rename)(tmp, filename)
+    return shard, len(items)
+
+
+def generate_note_dataset(soundfont, presets, pitches, velocities, duration, directory,
+                          clip_length=None, samplerate=16000.0, shard_size=1024, processes=None,
+                          progress_callback=None, **kwargs):
+    """Render a corpus of single notes into sharded, memory-mappable ``.npy`` files.
+
+    Every combination of preset, pitch and velocity is rendered into a clip
+    of fixed length by a pool of worker processes, each holding its own synth
+    with the soundfont loaded. Clips are stored as ``float32`` arrays of shape
+    ``(clips, frames, 2)`` in ``shard-NNNNN.npy`` files; ``index.npy`` holds
+    a ``DATASET_INDEX_DTYPE`` record per clip giving its shard and row.
+
+    Shards are written under a temporary name and renamed when complete, so
+    an interrupted run can be resumed by calling this function again with
+    the same arguments; existing shards are skipped.
+
+    :param soundfont: SoundFont file name / path
+    :type soundfont: ``str``
+    :param presets: ``(bank, preset)`` pairs
+    :type presets: iterable of ``tuple``
+    :param pitches: MIDI note numbers
+    :type pitches: iterable of ``int``
+    :param velocities: note velocities
+    :type velocities: iterable of ``int``
+    :param duration: note duration in seconds
+    :type duration: ``float``
+    :param directory: output directory, created if it does not exist
+    :type directory: ``str``
+    :param clip_length: clip length in seconds, defaults to ``duration``
+        plus one second for the release
+    :type clip_length: ``float``
+    :param samplerate: sample rate in Hz
+    :type samplerate: ``float``
+    :param shard_size: number of clips per shard
+    :type shard_size: ``int``
+    :param processes: number of worker processes, defaults to the number of
+        CPUs
+    :type processes: ``int``
+    :param progress_callback: Python callable called after each finished
+        shard with the number of clips done and the total number of clips
+    :type progress_callback: callable with 2 positional args
+    :return: ``dict`` with the number of ``clips`` and ``shards``, the
+        number of shards ``skipped`` because they already existed, the
+        elapsed ``seconds`` and ``clips_per_second`` rendered in this run
+
+    Other keyword arguments are passed to the ``Synth`` constructor in the
+    worker processes.
+
+    """
+    import numpy
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    if clip_length is None:
+        clip_length = duration + 1.0
+
+    items = list(itertools.product(presets, pitches, velocities))
+    index = numpy.empty(len(items), dtype=DATASET_INDEX_DTYPE)
+    tasks = []
+
+    for shard, start in enumerate(range(0, len(items), shard_size)):
+        chunk = [(bank, preset, pitch, vel)
+                 for (bank, preset), pitch, vel in items[start:start + shard_size]]
+        rows = index[start:start + len(chunk)]
+        columns = numpy.array(chunk, dtype=numpy.int32).reshape(-1, 4)
+
+        for col, field in enumerate(('bank', 'preset', 'pitch', 'velocity')):
+            rows[field] = columns[:, col]
+
+        rows['shard'] = shard
+        rows['row'] = numpy.arange(len(chunk))
+        filename = os.path.join(directory, 'shard-%05i.npy' % shard)
+
+        if not os.path.exists(filename):
+            tasks.append((shard, chunk, duration, int(round(clip_length * samplerate)),
+                          filename))
+
+    numpy.save(os.path.join(directory, 'index.npy'), index)
+    shards = (len(items) + shard_size - 1) // shard_size
+    done = len(items) - sum(len(task[1]) for task in tasks)
+    rendered = 0
+    start = default_timer()
+
+    if tasks:
+        # Check the soundfont here, errors in the pool workers are hard to handle
+        synth = Synth(samplerate=samplerate, **kwargs)
+        loaded = synth.sfload(soundfont) != FLUID_FAILED
+        synth.delete()
+
+        if not loaded:
+            raise OSError("Could not load SoundFont '%s'." % soundfont)
+
+        pool = multiprocessing.Pool(processes, _dataset_worker_init,
+                                    (soundfont, samplerate, kwargs))
+        try:
+            for shard, count in pool.imap_unordered(_dataset_render_shard, tasks):
+                rendered += count
+                if progress_callback:
+                    progress_callback(done + rendered, len(items))
+        finally:
+            pool.terminate()
+            pool.join()
+
+    elapsed = default_timer() - start
+    return {
+        'clips': len(items),
+        'shards': shards,
+        'skipped': shards - len(tasks),
+        'seconds': elapsed,
+        'clips_per_second': rendered / elapsed if elapsed else 0.0,
+    }
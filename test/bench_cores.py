@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks rendering a Standard MIDI File (SMF) with 1 to N ``synth.cpu-cores``."""
+
+import sys
+import multiprocessing
+
+from fluidsynth import Synth, read_smf
+
+
+def main(args=None):
+    if len(args) < 2:
+        return "Usage: bench_cores.py <SF2 file> <SMF input file> [<max cores> [<polyphony>]]"
+    else:
+        sf2_filename = args.pop(0)
+        smf_filename = args.pop(0)
+
+    max_cores = int(args.pop(0)) if args else multiprocessing.cpu_count()
+    polyphony = int(args.pop(0)) if args else 1024
+    smf = read_smf(smf_filename)
+    baseline = None
+
+    print("cores  seconds  realtime  speedup")
+    for cores in range(1, max_cores + 1):
+        synth = Synth(cpu_cores=cores, **{'synth.polyphony': polyphony})
+        synth.sfload(sf2_filename)
+        synth.render_events(smf.events, smf.division, smf.tempo_map, block_size=4096,
+                            skip_silence=False)
+        stats = synth.render_stats
+        synth.delete()
+
+        if baseline is None:
+            baseline = stats.elapsed
+
+        print("%5d  %7.2f  %7.1fx  %7.2f" % (cores, stats.elapsed, stats.realtime_factor,
+                                             baseline / stats.elapsed))
+
+    synth = Synth(cpu_cores='auto', **{'synth.polyphony': polyphony})
+    print("auto: %d cores" % synth.setting('synth.cpu-cores'))
+    synth.delete()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]) or 0)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks rendering Standard MIDI Files (SMF) with each interpolation method.
+
+Reports the realtime factor and the error relative to 7th-order interpolation.
+
+"""
+
+import sys
+
+import numpy
+
+from fluidsynth import (FLUID_INTERP_4THORDER, FLUID_INTERP_7THORDER, FLUID_INTERP_LINEAR,
+                        FLUID_INTERP_NONE, Synth, read_smf)
+
+METHODS = (
+    ('7th-order', FLUID_INTERP_7THORDER),
+    ('4th-order', FLUID_INTERP_4THORDER),
+    ('linear', FLUID_INTERP_LINEAR),
+    ('none', FLUID_INTERP_NONE),
+)
+
+
+def render(sf2_filename, smf, method):
+    synth = Synth()
+    synth.sfload(sf2_filename)
+    synth.set_interp_method(method)
+    # Render without skipping silence or tails, so all outputs align
+    audio = synth.render_events(smf.events, smf.division, smf.tempo_map, block_size=4096,
+                                skip_silence=False, tail=False)
+    stats = synth.render_stats
+    synth.delete()
+    return audio, stats
+
+
+def main(args=None):
+    if len(args) < 2:
+        return "Usage: bench_interp.py <SF2 file> <SMF input file> [<SMF input file> ...]"
+    else:
+        sf2_filename = args.pop(0)
+
+    print("file                  method     realtime  error (dB)")
+    for smf_filename in args:
+        smf = read_smf(smf_filename)
+        reference = None
+
+        for name, method in METHODS:
+            audio, stats = render(sf2_filename, smf, method)
+
+            if reference is None:
+                reference = audio
+                ref_rms = numpy.sqrt(numpy.mean(numpy.square(reference, dtype=numpy.float64)))
+                error = "-"
+            else:
+                rms = numpy.sqrt(numpy.mean(numpy.square(audio - reference, dtype=numpy.float64)))
+                error = "%.1f" % (20 * numpy.log10(rms / ref_rms)) if rms and ref_rms else "-inf"
+
+            print("%-20s  %-9s  %7.1fx  %10s" % (smf_filename[-20:], name,
+                                                 stats.realtime_factor, error))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]) or 0)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmarks rendering a Standard MIDI File (SMF) with 1 to N threads of ParallelRenderer."""
+
+import sys
+import multiprocessing
+from timeit import default_timer
+
+from fluidsynth import ParallelRenderer, read_smf
+
+
+def main(args=None):
+    if len(args) < 2:
+        return "Usage: bench_parallel.py <SF2 file> <SMF input file> [<max threads> [<jobs>]]"
+    else:
+        sf2_filename = args.pop(0)
+        smf_filename = args.pop(0)
+
+    max_threads = int(args.pop(0)) if args else multiprocessing.cpu_count()
+    num_jobs = int(args.pop(0)) if args else max_threads * 2
+    smf = read_smf(smf_filename)
+    baseline = None
+
+    print("threads  seconds  jobs/s  speedup")
+    for threads in range(1, max_threads + 1):
+        renderer = ParallelRenderer([sf2_filename], threads)
+        start = default_timer()
+        renderer.render_events([smf] * num_jobs, block_size=4096)
+        elapsed = default_timer() - start
+        renderer.delete()
+
+        if baseline is None:
+            baseline = elapsed
+
+        print("%7d  %7.2f  %6.2f  %7.2f" % (threads, elapsed, num_jobs / elapsed,
+                                            baseline / elapsed))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]) or 0)
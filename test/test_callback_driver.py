@@ -0,0 +1,48 @@
+"""Checks that Synth.start() with a callback runs it for every audio driver period."""
+
+import os
+import tempfile
+import time
+from os.path import dirname, join
+
+import numpy
+
+import fluidsynth
+
+fd, filename = tempfile.mkstemp(suffix=".raw")
+os.close(fd)
+
+calls = []
+
+
+def callback(out, fx):
+    peak = max(float(numpy.abs(buf).max()) for buf in out)
+    calls.append((len(out), len(fx), out[0].dtype, len(out[0]), peak))
+
+
+# No audio device needed. FluidSynth's file driver has no callback support,
+# so start() emulates it in a Python thread writing the same file.
+fs = fluidsynth.Synth(**{"audio.file.name": filename, "audio.file.type": "raw"})
+sfid = fs.sfload(join(dirname(__file__), "example.sf2"))
+fs.program_select(0, sfid, 0, 0)
+fs.start(driver="file", callback=callback)
+fs.noteon(0, 60, 100)
+time.sleep(0.5)
+fs.noteoff(0, 60)
+time.sleep(0.2)
+fs.delete()
+
+stats = fs.callback_stats
+assert stats["periods"] > 0, stats
+assert stats["frames"] > 0, stats
+assert stats["errors"] == 0, (stats, fs.callback_error)
+assert len(calls) == stats["periods"], (len(calls), stats)
+assert all(dtype == numpy.float32 for _, _, dtype, _, _ in calls)
+assert all(nout >= 2 for nout, _, _, _, _ in calls)
+assert sum(length for _, _, _, length, _ in calls) == stats["frames"]
+assert any(peak > 0.0 for _, _, _, _, peak in calls), "callback only saw silence"
+# Raw 16-bit stereo samples of every period
+assert os.path.getsize(filename) == stats["frames"] * 4, os.path.getsize(filename)
+
+os.remove(filename)
+print("OK")
@@ -0,0 +1,41 @@
+"""Checks that Synth.render_events() output is the same with and without silence skipping."""
+
+from os.path import dirname, join
+
+import numpy
+
+import fluidsynth
+
+# Two short notes with a long gap, at 120 BPM and 480 ticks per quarter note
+events = numpy.zeros(4, dtype=fluidsynth.SMF_EVENT_DTYPE)
+events['tick'] = [0, 240, 9600, 9840]
+events['type'] = [0x90, 0x80, 0x90, 0x80]
+events['p1'] = 60
+events['p2'] = [100, 0, 100, 0]
+
+
+def render(skip_silence, effects):
+    fs = fluidsynth.Synth(**{"synth.reverb.active": int(effects),
+                             "synth.chorus.active": int(effects)})
+    sfid = fs.sfload(join(dirname(__file__), "example.sf2"))
+    fs.program_select(0, sfid, 0, 0)
+    audio = fs.render_events(events, skip_silence=skip_silence)
+    stats = fs.render_stats
+    fs.delete()
+    return audio, stats
+
+
+for effects in (False, True):
+    full, full_stats = render(False, effects)
+    skipped, stats = render(True, effects)
+    assert full_stats.skipped_frames == 0
+    assert numpy.array_equal(full, skipped), numpy.abs(full - skipped).max()
+
+    if effects:
+        # Reverb and chorus modulation runs on in silence, nothing is skipped
+        assert stats.skipped_frames == 0, stats
+    else:
+        assert stats.skipped_frames > 0, stats
+        assert stats.speedup > 1.0, stats
+
+print("OK")
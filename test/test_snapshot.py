@@ -0,0 +1,43 @@
+"""Checks that Synth.restore() brings back a state taken with Synth.snapshot()."""
+
+from os.path import dirname, join
+
+import fluidsynth
+
+fs = fluidsynth.Synth(channels=16)
+sfid = fs.sfload(join(dirname(__file__), "example.sf2"))
+fs.program_select(0, sfid, 0, 0)
+
+# Controllers, pitch bend and a pitch bend range set via RPN 0 data entry
+fs.cc(0, 7, 90)
+fs.cc(1, 10, 20)
+fs.cc(1, 101, 0)
+fs.cc(1, 100, 0)
+fs.cc(1, 6, 12)
+fs.pitch_bend(2, 1000)
+snap = fs.snapshot()
+assert snap.cc.shape == (16, 128)
+assert snap.cc[0, 7] == 90 and snap.cc[1, 10] == 20 and snap.cc[1, 6] == 12
+assert snap.pitch_bend[2] == 9192
+assert snap.sfont[0] == sfid
+
+# Change the state, with a different RPN selected on channel 1
+fs.cc(0, 7, 10)
+fs.cc(1, 101, 127)
+fs.cc(1, 100, 127)
+fs.cc(1, 6, 1)
+fs.pitch_bend(2, 0)
+fs.program_select(0, sfid, 0, 1)
+
+applied = fs.restore(snap)
+assert applied > 0
+state = fs.snapshot()
+assert (state.cc[:, :120] == snap.cc[:, :120]).all()
+assert (state.program == snap.program).all()
+assert (state.pitch_bend == snap.pitch_bend).all()
+
+# Unchanged state: only the RPN / NRPN selection and data entry are replayed
+assert fs.restore(snap) == 16 * 6
+
+fs.delete()
+print("OK")